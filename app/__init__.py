@@ -38,6 +38,7 @@ def build_application(environment='development'):
     task_queue.conf.timezone = timezone
 
     from app import models
+    from app import subscriptions  # Keeps the subscription index in step with user writes
     
     migration_tool.init_app(application, database)
 
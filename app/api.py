@@ -1,90 +1,237 @@
-from bs4 import BeautifulSoup
 from flask import jsonify
+from app import metrics
+from app.cache import TTLCache
+from collections import namedtuple
+import lxml.html
 from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import requests
-from datetime import datetime
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
-cached_data_latest = None
-last_fetch_time_latest = None
 CACHE_DURATION = 5 * 60
+STALE_CACHE_DURATION = 5 * 60
 BASE_URL = 'https://earthquake.phivolcs.dost.gov.ph/'
+BULLETIN_TABLE_XPATH = "//table[contains(concat(' ', normalize-space(@class), ' '), ' MsoNormalTable ')]"
+BULLETIN_STATE_KEY = 'phivolcs:bulletin_state'
 
-def fetch_latest_earthquake_raw():
-    """Fetch raw earthquake data without JSON wrapping"""
-    global cached_data_latest, last_fetch_time_latest
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': "keep-alive",
+}
+
+# Connection pool and timeouts for PHIVOLCS requests
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+
+_http_session = None
+_http_session_pid = None
+
+latest_earthquake_cache = TTLCache('phivolcs:latest', CACHE_DURATION, STALE_CACHE_DURATION)
+
+# Result of a conditional bulletin fetch; events is None when nothing changed
+BulletinFetch = namedtuple('BulletinFetch', ['changed', 'events', 'state'])
+
+
+def _cell_text(cell):
+    """Whitespace-trimmed text content of a table cell"""
+    return cell.text_content().strip()
+
+
+def parse_bulletin_row(row):
+    """Parse one bulletin table row into an earthquake dict, or None if it is not an event row"""
+    cells = row.xpath('.//td')
+    
+    if len(cells) != 6:
+        return None
+    
+    date_time_cell, latitude_cell, longitude_cell, depth_cell, magnitude_cell, location_cell = cells
+    
+    a_tag = date_time_cell.find('.//a')
+    if a_tag is None:
+        return None
+    
+    href = a_tag.get('href')
+    detail_link = urljoin(BASE_URL, href.replace('\\', '/')) if href else None
+    
+    return {
+        "date_time": a_tag.text_content().strip(),
+        "latitude": _cell_text(latitude_cell),
+        "longitude": _cell_text(longitude_cell),
+        "depth": _cell_text(depth_cell),
+        "magnitude": _cell_text(magnitude_cell),
+        "location": _cell_text(location_cell),
+        "detail_link": detail_link
+    }
 
-    try:
-        now = datetime.now()
 
-        if cached_data_latest and last_fetch_time_latest and (now.second - last_fetch_time_latest.second) < CACHE_DURATION:
-            return cached_data_latest
+def _iter_event_rows(document):
+    """Yield parsed event rows from every bulletin table in a parsed document"""
+    for table in document.xpath(BULLETIN_TABLE_XPATH):
+        for row in table.xpath('.//tr')[1:]:
+            earthquake = parse_bulletin_row(row)
+            if earthquake:
+                yield earthquake
+
+
+def parse_latest_earthquake(html):
+    """Return the newest bulletin entry from the PHIVOLCS page, stopping at the first match"""
+    document = lxml.html.fromstring(html)
+    
+    for table in document.xpath(BULLETIN_TABLE_XPATH):
+        rows = table.xpath('.//tr')
+        if len(rows) < 2:
+            continue
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': "keep-alive",
-        }
+        earthquake = parse_bulletin_row(rows[1])
+        if earthquake:
+            return earthquake
+    
+    return None
+
+
+def get_http_session():
+    """Process-wide pooled session with retries, rebuilt after a fork"""
+    global _http_session, _http_session_pid
+    
+    if _http_session is None or _http_session_pid != os.getpid():
+        retries = Retry(
+            total=HTTP_MAX_RETRIES,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+        
+        session = requests.Session()
+        session.headers.update(REQUEST_HEADERS)
+        session.verify = False
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        
+        _http_session = session
+        _http_session_pid = os.getpid()
+    
+    return _http_session
 
-        res = requests.get(BASE_URL, headers=headers, verify=False, timeout=10)
-        soup = BeautifulSoup(res.text, "html.parser")
-        tables = soup.select('table.MsoNormalTable')
 
-        for table in tables:
-            try:
-                row = table.select('tr')[1]
-            except:
-                continue
+def http_get(url, headers=None):
+    """GET through the shared session with separate connect and read timeouts"""
+    return get_http_session().get(url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
 
-            cells = row.find_all('td')
 
-            if not cells or len(cells) != 6:
-                continue
+def fetch_bulletin_page():
+    """Download the PHIVOLCS bulletin page HTML"""
+    return http_get(BASE_URL).text
+
+
+def bulletin_fingerprint(document):
+    """Hash of the bulletin tables only, ignoring the rest of the page"""
+    digest = hashlib.sha256()
+    for table in document.xpath(BULLETIN_TABLE_XPATH):
+        digest.update(lxml.html.tostring(table))
+    return digest.hexdigest()
+
+
+def _load_bulletin_state():
+    """Validators and fingerprint from the last fully processed bulletin"""
+    from app import redis_client
+    
+    try:
+        if redis_client:
+            state = redis_client.hgetall(BULLETIN_STATE_KEY)
+            return {key.decode('utf-8'): value.decode('utf-8') for key, value in state.items()}
+    except Exception as e:
+        logger.error(f"Bulletin state get error: {e}")
+    return {}
+
+
+def remember_bulletin_state(state):
+    """Record a bulletin as processed so identical content is skipped next poll"""
+    from app import redis_client
+    
+    try:
+        if redis_client and state:
+            redis_client.hset(BULLETIN_STATE_KEY, mapping=state)
+    except Exception as e:
+        logger.error(f"Bulletin state set error: {e}")
+
+
+def fetch_bulletin_if_changed():
+    """Conditionally fetch the bulletin, short-circuiting when its tables are unchanged
+    
+    Returns None if the fetch failed. Callers should pass the returned state to
+    remember_bulletin_state once every event has been handled.
+    """
+    try:
+        previous = _load_bulletin_state()
+        headers = {}
+        
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+        
+        res = http_get(BASE_URL, headers=headers)
+        metrics.increment('phivolcs_polls')
+        
+        if res.status_code == 304:
+            metrics.increment('phivolcs_polls_skipped')
+            return BulletinFetch(False, None, previous)
         
-            date_time_cell = cells[0]
-            latitude_cell = cells[1]
-            longitude_cell = cells[2]
-            depth_cell = cells[3]
-            magnitude_cell = cells[4]
-            location_cell = cells[5]
-
-            date_time = date_time_cell.find('a').get_text().strip()
-            a_tag = date_time_cell.find('a')
-            
-            if a_tag and 'href' in a_tag.attrs:
-                href = a_tag['href']
-                normalized_path = href.replace('\\','/')
-                detail_link = urljoin(BASE_URL, normalized_path)
-            else:
-                detail_link = None
-
-            earthquake = {
-                "date_time": date_time,
-                "latitude": latitude_cell.get_text().strip(),
-                "longitude": longitude_cell.get_text().strip(),
-                "depth": depth_cell.get_text().strip(),
-                "magnitude": magnitude_cell.get_text().strip(),
-                "location": location_cell.get_text().strip(),
-                "detail_link": detail_link
-            }
+        res.raise_for_status()
+        document = lxml.html.fromstring(res.text)
+        state = {
+            'etag': res.headers.get('ETag', ''),
+            'last_modified': res.headers.get('Last-Modified', ''),
+            'content_hash': bulletin_fingerprint(document),
+        }
+        
+        if state['content_hash'] == previous.get('content_hash'):
+            metrics.increment('phivolcs_polls_skipped')
+            remember_bulletin_state(state)
+            return BulletinFetch(False, None, state)
         
-        cached_data_latest = earthquake
-        last_fetch_time_latest = now
-        return earthquake
+        return BulletinFetch(True, _iter_event_rows(document), state)
     
     except Exception as e:
+        logger.error(f"Bulletin fetch error: {e}")
         return None
 
 
+def _scrape_latest_earthquake():
+    """Scrape the newest bulletin entry, returning None on any failure"""
+    try:
+        return parse_latest_earthquake(fetch_bulletin_page())
+    except Exception as e:
+        logger.error(f"Latest earthquake scrape error: {e}")
+        return None
+
+
+def fetch_latest_earthquake_raw():
+    """Fetch raw earthquake data without JSON wrapping"""
+    return latest_earthquake_cache.get('latest', _scrape_latest_earthquake)
+
+
 def get_latest_earthquake():
     """API endpoint version with JSON response"""
-    data = fetch_latest_earthquake_raw()
+    result = latest_earthquake_cache.lookup('latest', _scrape_latest_earthquake)
     
-    if data:
+    if result.value:
         return jsonify({
             "success": True,
-            "data": data,
-            "cached": False
+            "data": result.value,
+            "cached": result.cached
         })
     else:
         return jsonify({
@@ -0,0 +1,136 @@
+from flask import current_app
+from flask_mail import sanitize_address, sanitize_addresses
+import aiosmtplib
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a session is dropped and reopened
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError, asyncio.TimeoutError)
+
+# Attempts per message, counting the first send
+SEND_ATTEMPTS = 2
+
+
+class AsyncMailer:
+    """Send many messages concurrently over a bounded pool of SMTP sessions"""
+    
+    def __init__(self, hostname, port, username=None, password=None, start_tls=False,
+                 use_ssl=False, concurrency=5, rate_limit=0, timeout=30):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_ssl = use_ssl
+        self.concurrency = concurrency
+        self.min_interval = 1.0 / rate_limit if rate_limit else 0
+        self.timeout = timeout
+        self._next_slot = 0.0
+        self._throttle_lock = None
+    
+    @classmethod
+    def from_config(cls, config):
+        """Build a mailer from the Flask-Mail settings"""
+        return cls(
+            hostname=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            start_tls=config.get('MAIL_USE_TLS', False),
+            use_ssl=config.get('MAIL_USE_SSL', False),
+            concurrency=config['MAIL_ASYNC_CONCURRENCY'],
+            rate_limit=config['MAIL_RATE_LIMIT_PER_SECOND']
+        )
+    
+    def send_all(self, envelopes):
+        """Blocking entry point for Celery tasks; returns one boolean per envelope"""
+        return asyncio.run(self.send_many(envelopes))
+    
+    async def send_many(self, envelopes):
+        """Send (sender, recipients, message_bytes) envelopes with at most N open sessions"""
+        results = [False] * len(envelopes)
+        queue = asyncio.Queue()
+        self._throttle_lock = asyncio.Lock()
+        
+        for index, envelope in enumerate(envelopes):
+            queue.put_nowait((index, envelope))
+        
+        workers = min(self.concurrency, len(envelopes))
+        await asyncio.gather(*(self._worker(queue, results) for _ in range(workers)))
+        return results
+    
+    async def _worker(self, queue, results):
+        """Drain the queue over one SMTP session, reconnecting when it drops"""
+        smtp = None
+        
+        while not queue.empty():
+            index, (sender, recipients, body) = queue.get_nowait()
+            await self._throttle()
+            
+            for attempt in range(SEND_ATTEMPTS):
+                try:
+                    if smtp is None:
+                        smtp = await self._connect()
+                    await smtp.sendmail(sender, recipients, body)
+                    results[index] = True
+                    break
+                except CONNECTION_ERRORS as error:
+                    logger.warning(f"SMTP session lost ({error}), reconnecting")
+                    smtp = None
+                except Exception as error:
+                    logger.error(f"❌ Failed to send email to {', '.join(recipients)}: {error}")
+                    break
+        
+        if smtp is not None:
+            try:
+                await smtp.quit()
+            except Exception:
+                pass
+    
+    async def _connect(self):
+        """Open and authenticate one SMTP session"""
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_ssl,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        return smtp
+    
+    async def _throttle(self):
+        """Space sends out to respect the provider's rate limit"""
+        if not self.min_interval:
+            return
+        
+        async with self._throttle_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.min_interval
+        
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def send_bulk_async(messages):
+    """Send Flask-Mail messages concurrently; returns one boolean per message"""
+    if current_app.config.get('MAIL_SUPPRESS_SEND'):
+        return [True] * len(messages)
+    
+    envelopes = [
+        (sanitize_address(message.sender), list(sanitize_addresses(message.send_to)), message.as_bytes())
+        for message in messages
+    ]
+    results = AsyncMailer.from_config(current_app.config).send_all(envelopes)
+    
+    for message, sent in zip(messages, results):
+        if sent:
+            logger.info(f"✅ Notification sent to {', '.join(message.recipients)}")
+    return results
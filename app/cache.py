@@ -0,0 +1,227 @@
+from app.locks import RedisLock
+from collections import OrderedDict, namedtuple
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# cached is False only for the caller that actually ran the loader
+CacheResult = namedtuple('CacheResult', ['value', 'cached'])
+
+# How long the last good value is kept in Redis as a fallback for lock waiters
+LAST_KNOWN_TTL = 24 * 60 * 60
+
+# In-process entries kept per cache; the oldest written are dropped beyond this
+MAX_LOCAL_ENTRIES = 256
+
+
+class TTLCache:
+    """Two-level TTL cache: in-process entries on a monotonic clock in front of Redis
+    
+    Values must be JSON-serializable. Once the TTL has passed, a value is still
+    served for stale_ttl more seconds while one background refresh runs.
+    On a miss, one caller across all workers holds a Redis lock and runs the
+    loader. The others wait up to lock_wait seconds for its result and then
+    fall back to the last known value; they stop waiting as soon as the
+    holder gives up without a value, or when abandon_wait() returns True. At most max_entries values are held
+    in process; Redis keeps the rest.
+    """
+    
+    def __init__(self, namespace, ttl, stale_ttl=0, lock_wait=5, poll_interval=0.1, max_entries=MAX_LOCAL_ENTRIES,
+                 abandon_wait=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_wait = lock_wait
+        self.poll_interval = poll_interval
+        self.max_entries = max_entries
+        self.abandon_wait = abandon_wait
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key, loader):
+        """Return a cached value, calling loader() on a miss"""
+        return self.lookup(key, loader).value
+    
+    def lookup(self, key, loader):
+        """Return a CacheResult saying whether the value came from cache"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        
+        if entry and now < entry[1]:
+            return CacheResult(entry[0], True)
+        
+        shared = self._get_shared(key)
+        if shared:
+            value, age = shared
+            self._store_local(key, value, age)
+            if age < self.ttl:
+                return CacheResult(value, True)
+            entry = self._entries.get(key)
+        
+        if entry and now < entry[2]:
+            self._refresh_in_background(key, loader)
+            return CacheResult(entry[0], True)
+        
+        return self._refresh(key, loader)
+    
+    def peek(self, key):
+        """Return a fresh cached value without loading, or None"""
+        entry = self._entries.get(key)
+        if entry and time.monotonic() < entry[1]:
+            return entry[0]
+        
+        shared = self._get_shared(key)
+        if shared and shared[1] < self.ttl:
+            self._store_local(key, shared[0], shared[1])
+            return shared[0]
+        return None
+    
+    def put(self, key, value):
+        """Store a value in both cache levels"""
+        self._store_local(key, value, 0)
+        self._set_shared(key, value)
+    
+    def _refresh(self, key, loader):
+        """Load a value, letting only one caller per process run the loader"""
+        with self._lock:
+            done = self._inflight.get(key)
+            is_leader = done is None
+            if is_leader:
+                done = threading.Event()
+                self._inflight[key] = done
+        
+        if not is_leader:
+            done.wait(self.lock_wait * 2)
+            entry = self._entries.get(key)
+            return CacheResult(entry[0] if entry else None, True)
+        
+        try:
+            return self._load_across_workers(key, loader)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+    
+    def _load_across_workers(self, key, loader):
+        """Run the loader under a Redis lock, or wait for the worker that holds it"""
+        lock = RedisLock(self._redis_key(key), ttl_seconds=self.lock_wait * 2)
+        
+        try:
+            acquired = lock.acquire()
+        except Exception as e:
+            logger.error(f"Cache lock error: {e}")
+            acquired = True
+        
+        if acquired:
+            try:
+                value = loader()
+                if value is not None:
+                    self._store_local(key, value, 0)
+                    self._set_shared(key, value)
+                return CacheResult(value, False)
+            finally:
+                lock.release()
+        
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline and not self._should_stop_waiting():
+            time.sleep(self.poll_interval)
+            shared = self._get_shared(key)
+            if shared and shared[1] < self.ttl:
+                self._store_local(key, shared[0], shared[1])
+                return CacheResult(shared[0], True)
+            if not self._is_locked(lock):
+                # The holder finished without storing a value
+                break
+        
+        entry = self._entries.get(key)
+        if entry:
+            return CacheResult(entry[0], True)
+        return CacheResult(self._get_last_known(key), True)
+    
+    def _should_stop_waiting(self):
+        """Whether waiters should fall back now instead of polling for the holder's result"""
+        try:
+            return bool(self.abandon_wait and self.abandon_wait())
+        except Exception as e:
+            logger.error(f"Cache wait check error: {e}")
+            return False
+    
+    def _is_locked(self, lock):
+        """Whether another worker still holds the loader lock"""
+        from app import redis_client
+        
+        try:
+            return bool(redis_client and redis_client.get(lock.key))
+        except Exception as e:
+            logger.error(f"Cache lock check error: {e}")
+            return True
+    
+    def _refresh_in_background(self, key, loader):
+        """Start a refresh thread unless one is already running for this key"""
+        if key in self._inflight:
+            return
+        
+        def run():
+            try:
+                self._refresh(key, loader)
+            except Exception as e:
+                logger.error(f"Background cache refresh error for {key}: {e}")
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def _store_local(self, key, value, age):
+        """Remember a value whose shared copy is already age seconds old"""
+        now = time.monotonic()
+        fresh_until = now + self.ttl - age
+        
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _redis_key(self, key):
+        return f"{self.namespace}:{key}"
+    
+    def _get_shared(self, key):
+        """Return (value, age_seconds) from Redis, or None"""
+        from app import redis_client
+        
+        try:
+            if redis_client:
+                payload = redis_client.get(self._redis_key(key))
+                if payload:
+                    data = json.loads(payload)
+                    return data['value'], max(time.time() - data['stored_at'], 0)
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+        return None
+    
+    def _get_last_known(self, key):
+        """Most recent value ever stored, regardless of freshness"""
+        from app import redis_client
+        
+        try:
+            if redis_client:
+                payload = redis_client.get(f"{self._redis_key(key)}:last")
+                if payload:
+                    return json.loads(payload)
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+        return None
+    
+    def _set_shared(self, key, value):
+        """Store a value in Redis for every worker process"""
+        from app import redis_client
+        
+        try:
+            if redis_client:
+                payload = json.dumps({'value': value, 'stored_at': time.time()})
+                redis_client.setex(self._redis_key(key), int(self.ttl + self.stale_ttl) or 1, payload)
+                redis_client.setex(f"{self._redis_key(key)}:last", LAST_KNOWN_TTL, json.dumps(value))
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
@@ -8,6 +8,13 @@ beat_schedule = {
             'expires': 240.0,
         }
     },
+    'sweep-stalled-deliveries-every-2-minutes': {
+        'task': 'app.tasks.sweep_stalled_deliveries',
+        'schedule': 120.0,
+        'options': {
+            'expires': 100.0,
+        }
+    },
 }
 
 timezone = 'Asia/Manila'
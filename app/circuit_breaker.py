@@ -0,0 +1,87 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Failure counter shared by every worker through Redis
+    
+    After failure_threshold consecutive failures within failure_window seconds
+    the circuit opens and allow() returns False for reset_timeout seconds.
+    Then one caller is let through as a probe: success closes the circuit,
+    failure opens it again. Without Redis the breaker never opens.
+    """
+    
+    def __init__(self, name, failure_threshold=3, reset_timeout=60, failure_window=120):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_window = failure_window
+        self.failures_key = f"circuit:{name}:failures"
+        self.open_key = f"circuit:{name}:open"
+        self.tripped_key = f"circuit:{name}:tripped"
+        self.probe_key = f"circuit:{name}:probe"
+    
+    def allow(self):
+        """Whether a call may go out now"""
+        from app import redis_client
+        
+        try:
+            if not redis_client:
+                return True
+            if redis_client.get(self.open_key):
+                return False
+            if redis_client.get(self.tripped_key):
+                # Half-open: a single probe per reset period
+                return bool(redis_client.set(self.probe_key, 1, nx=True, ex=self.reset_timeout))
+            return True
+        except Exception as e:
+            logger.error(f"Circuit breaker read error for {self.name}: {e}")
+            return True
+    
+    def record_success(self):
+        """Close the circuit and reset the failure count"""
+        from app import redis_client
+        
+        try:
+            if redis_client:
+                if redis_client.get(self.tripped_key):
+                    logger.info(f"✅ Circuit {self.name} closed")
+                redis_client.delete(self.failures_key, self.tripped_key, self.probe_key)
+        except Exception as e:
+            logger.error(f"Circuit breaker write error for {self.name}: {e}")
+    
+    def record_failure(self):
+        """Count a failure, opening the circuit at the threshold or when a probe fails"""
+        from app import redis_client
+        
+        try:
+            if not redis_client:
+                return
+            failures = redis_client.incr(self.failures_key)
+            redis_client.expire(self.failures_key, self.failure_window)
+            
+            if failures >= self.failure_threshold or redis_client.get(self.tripped_key):
+                self._open(redis_client)
+        except Exception as e:
+            logger.error(f"Circuit breaker write error for {self.name}: {e}")
+    
+    def state(self):
+        """'closed', 'open' or 'half_open'"""
+        from app import redis_client
+        
+        try:
+            if redis_client:
+                if redis_client.get(self.open_key):
+                    return 'open'
+                if redis_client.get(self.tripped_key):
+                    return 'half_open'
+        except Exception as e:
+            logger.error(f"Circuit breaker read error for {self.name}: {e}")
+        return 'closed'
+    
+    def _open(self, redis_client):
+        redis_client.set(self.open_key, 1, ex=self.reset_timeout)
+        redis_client.set(self.tripped_key, 1)
+        redis_client.delete(self.probe_key)
+        logger.warning(f"⚠️ Circuit {self.name} opened for {self.reset_timeout}s")
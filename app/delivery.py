@@ -0,0 +1,240 @@
+from app import database, metrics
+from app.models import NotificationDelivery, SeismicEvent
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A 'sending' claim older than this is assumed to belong to a dead worker
+CLAIM_LEASE_SECONDS = 10 * 60
+
+# Deliveries are abandoned after this many claims; deliver_notification_batch
+# claims once per run, so its retries are derived from this
+MAX_DELIVERY_ATTEMPTS = 4
+
+# Rows per bulk INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+def _insert_ignoring_duplicates():
+    """Dialect-specific INSERT that skips rows violating the (event, user) constraint
+    
+    None when the dialect has no such INSERT; see _insert_missing.
+    """
+    table = NotificationDelivery.__table__
+    dialect = database.engine.dialect.name
+    
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing(index_elements=['event_id', 'user_id'])
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing(index_elements=['event_id', 'user_id'])
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    
+    return None
+
+
+def _insert_missing(rows):
+    """Portable fallback: insert only the rows whose recipient is not in the ledger yet
+    
+    A concurrent insert of the same recipient makes the chunk fail its unique
+    constraint; it is then retried against the new ledger contents.
+    """
+    event_id = rows[0]['event_id']
+    
+    for attempt in range(2):
+        existing = {
+            user_id for (user_id,) in database.session.query(NotificationDelivery.user_id).filter(
+                NotificationDelivery.event_id == event_id,
+                NotificationDelivery.user_id.in_([row['user_id'] for row in rows])
+            )
+        }
+        missing = [row for row in rows if row['user_id'] not in existing]
+        if not missing:
+            return
+        
+        try:
+            with database.session.begin_nested():
+                database.session.execute(NotificationDelivery.__table__.insert(), missing)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+
+
+def record_pending_deliveries(event_id, user_ids):
+    """Bulk-insert pending ledger rows; recipients already in the ledger are left untouched
+    
+    Not committed, so the rows land in the same transaction as the caller's
+    ownership check.
+    """
+    statement = _insert_ignoring_duplicates()
+    now = datetime.utcnow()
+    
+    for start in range(0, len(user_ids), INSERT_CHUNK_SIZE):
+        rows = [
+            {'event_id': event_id, 'user_id': user_id, 'status': 'pending', 'attempts': 0, 'created_at': now}
+            for user_id in user_ids[start:start + INSERT_CHUNK_SIZE]
+        ]
+        if statement is None:
+            _insert_missing(rows)
+        else:
+            database.session.execute(statement, rows)
+
+
+def claim_deliveries(event_id, user_ids):
+    """Atomically claim the deliveries that still need sending; returns (claim token, claimed user ids)
+    
+    Rows that were sent, or that another worker is actively sending, are skipped,
+    so retries and parallel workers never email the same recipient twice.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    
+    NotificationDelivery.query.filter(
+        NotificationDelivery.event_id == event_id,
+        NotificationDelivery.user_id.in_(user_ids),
+        NotificationDelivery.attempts < MAX_DELIVERY_ATTEMPTS,
+        or_(
+            NotificationDelivery.status.in_(['pending', 'failed']),
+            and_(NotificationDelivery.status == 'sending', NotificationDelivery.claimed_at < stale_before)
+        )
+    ).update({
+        NotificationDelivery.status: 'sending',
+        NotificationDelivery.claim_token: token,
+        NotificationDelivery.claimed_at: now,
+        NotificationDelivery.attempts: NotificationDelivery.attempts + 1
+    }, synchronize_session=False)
+    database.session.commit()
+    
+    claimed = database.session.query(NotificationDelivery.user_id).filter(
+        NotificationDelivery.claim_token == token
+    ).all()
+    return token, [user_id for (user_id,) in claimed]
+
+
+def complete_deliveries(event_id, token, sent_ids, failed_ids):
+    """Record the outcome of a claimed batch
+    
+    Only rows still held under this batch's claim token are updated, so a
+    worker whose claim went stale cannot overwrite the new owner's status.
+    """
+    now = datetime.utcnow()
+    
+    if sent_ids:
+        NotificationDelivery.query.filter(
+            NotificationDelivery.event_id == event_id,
+            NotificationDelivery.user_id.in_(sent_ids),
+            NotificationDelivery.claim_token == token
+        ).update({
+            NotificationDelivery.status: 'sent',
+            NotificationDelivery.sent_at: now,
+            NotificationDelivery.claim_token: None
+        }, synchronize_session=False)
+    
+    if failed_ids:
+        NotificationDelivery.query.filter(
+            NotificationDelivery.event_id == event_id,
+            NotificationDelivery.user_id.in_(failed_ids),
+            NotificationDelivery.claim_token == token
+        ).update({
+            NotificationDelivery.status: 'failed',
+            NotificationDelivery.claim_token: None
+        }, synchronize_session=False)
+    
+    database.session.commit()
+
+
+def stalled_deliveries():
+    """{event_id: [user_id, ...]} for ledger rows that should have been sent by now
+    
+    Pending, failed or sending rows untouched for longer than the claim lease
+    and still under the attempt limit: their delivery task was lost, e.g.
+    with a worker that died mid-chunk.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    rows = database.session.query(NotificationDelivery.event_id, NotificationDelivery.user_id).filter(
+        NotificationDelivery.status.in_(['pending', 'failed', 'sending']),
+        NotificationDelivery.attempts < MAX_DELIVERY_ATTEMPTS,
+        func.coalesce(NotificationDelivery.claimed_at, NotificationDelivery.created_at) < stale_before
+    ).all()
+    
+    stalled = {}
+    for event_id, user_id in rows:
+        stalled.setdefault(event_id, []).append(user_id)
+    return stalled
+
+
+def unfinished_events():
+    """Dispatched events never marked processed that have no delivery left to send"""
+    stale_before = datetime.utcnow() - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    outstanding = exists().where(
+        NotificationDelivery.event_id == SeismicEvent.id,
+        or_(
+            NotificationDelivery.status == 'sending',
+            and_(
+                NotificationDelivery.status.in_(['pending', 'failed']),
+                NotificationDelivery.attempts < MAX_DELIVERY_ATTEMPTS
+            )
+        )
+    )
+    return SeismicEvent.query.filter(
+        SeismicEvent.dispatched_at < stale_before,
+        SeismicEvent.has_been_processed == False,
+        ~outstanding
+    ).all()
+
+
+def record_first_alert(event_id):
+    """Stamp the event's first successful send and record its latency from when the bulletin was seen"""
+    now = datetime.utcnow()
+    
+    stamped = SeismicEvent.query.filter(
+        SeismicEvent.id == event_id,
+        SeismicEvent.first_alert_at.is_(None)
+    ).update({SeismicEvent.first_alert_at: now}, synchronize_session=False)
+    database.session.commit()
+    
+    if not stamped:
+        return
+    
+    event = SeismicEvent.query.get(event_id)
+    if event.first_seen_at:
+        latency_ms = int((now - event.first_seen_at).total_seconds() * 1000)
+        metrics.increment('alert_latency_ms_total', latency_ms)
+        metrics.increment('alert_latency_samples')
+        logger.info(f"⏱️ First alert for {event.event_identifier} sent {latency_ms} ms after the bulletin was seen")
+
+
+def delivery_summary(event_id):
+    """Per-status counts and delivery latency (seconds after the event was recorded)"""
+    event = SeismicEvent.query.get(event_id)
+    if not event:
+        return None
+    
+    counts = dict(
+        database.session.query(NotificationDelivery.status, func.count())
+        .filter(NotificationDelivery.event_id == event_id)
+        .group_by(NotificationDelivery.status)
+        .all()
+    )
+    first_sent, last_sent = database.session.query(
+        func.min(NotificationDelivery.sent_at), func.max(NotificationDelivery.sent_at)
+    ).filter(NotificationDelivery.event_id == event_id).one()
+    
+    return {
+        'event_id': event.event_identifier,
+        'counts': counts,
+        'first_sent_after_seconds': (first_sent - event.recorded_at).total_seconds() if first_sent else None,
+        'last_sent_after_seconds': (last_sent - event.recorded_at).total_seconds() if last_sent else None,
+        'first_alert_after_seen_seconds': (
+            (event.first_alert_at - event.first_seen_at).total_seconds()
+            if event.first_alert_at and event.first_seen_at else None
+        )
+    }
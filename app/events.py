@@ -0,0 +1,119 @@
+from app.models import SeismicEvent, SeismicEventRevision
+from app.location_service import LocationAnalyzer
+from sqlalchemy import or_
+from datetime import datetime, timedelta
+import hashlib
+
+# Hex characters kept from the SHA-256 of the canonical fields
+EVENT_KEY_LENGTH = 32
+
+# A bulletin row within these bounds of a stored event is a revision of it
+MATCH_TIME_WINDOW = timedelta(minutes=3)
+MATCH_DISTANCE_KM = 30.0
+MATCH_MAGNITUDE_DELTA = 1.0
+MATCH_BOX_DEGREES = MATCH_DISTANCE_KM / 100.0  # Loose pre-filter; a degree is 100-111 km here
+
+
+def canonical_event_key(bulletin_data):
+    """Fixed-width key from normalized origin time, coordinates rounded to ~1 km, and magnitude"""
+    event_time = LocationAnalyzer.parse_event_time(bulletin_data['date_time'])
+    lat, lon = LocationAnalyzer.parse_coordinates(bulletin_data['latitude'], bulletin_data['longitude'])
+    magnitude = LocationAnalyzer.parse_magnitude(bulletin_data['magnitude'])
+    
+    origin = event_time.strftime('%Y-%m-%dT%H:%M') if event_time else ' '.join(bulletin_data['date_time'].lower().split())
+    # Rows without usable coordinates fall back to the location text
+    position = f"{lat:.2f}|{lon:.2f}" if lat is not None and lon is not None else ' '.join(bulletin_data['location'].lower().split())
+    canonical = f"{origin}|{position}|{magnitude:.1f}"
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:EVENT_KEY_LENGTH]
+
+
+def event_label(bulletin_data):
+    """Human-readable event name shown in logs and the API"""
+    return f"{bulletin_data['date_time']}_{bulletin_data['location']}"[:200]
+
+
+def bulletin_event_fields(bulletin_data):
+    """SeismicEvent column values parsed from a bulletin row"""
+    lat, lon = LocationAnalyzer.parse_coordinates(bulletin_data['latitude'], bulletin_data['longitude'])
+    
+    return {
+        'event_magnitude': LocationAnalyzer.parse_magnitude(bulletin_data['magnitude']),
+        'event_location': bulletin_data['location'],
+        'latitude_coord': lat,
+        'longitude_coord': lon,
+        'depth_km': LocationAnalyzer.parse_magnitude(bulletin_data['depth']),
+        'occurred_at': LocationAnalyzer.parse_event_time(bulletin_data['date_time']) or datetime.now()
+    }
+
+
+def revision_candidates(bulletin_data, listed_keys=()):
+    """(time delta, distance km, event) for every stored event this row could revise
+    
+    Events whose key is still listed in the bulletin (listed_keys) are separate
+    quakes, not earlier versions of this row. Rows without a parseable time or
+    coordinates are never matched.
+    """
+    event_time = LocationAnalyzer.parse_event_time(bulletin_data['date_time'])
+    lat, lon = LocationAnalyzer.parse_coordinates(bulletin_data['latitude'], bulletin_data['longitude'])
+    if not event_time or lat is None or lon is None:
+        return []
+    
+    magnitude = LocationAnalyzer.parse_magnitude(bulletin_data['magnitude'])
+    
+    candidates = SeismicEvent.query.filter(
+        SeismicEvent.occurred_at.between(event_time - MATCH_TIME_WINDOW, event_time + MATCH_TIME_WINDOW),
+        SeismicEvent.latitude_coord.between(lat - MATCH_BOX_DEGREES, lat + MATCH_BOX_DEGREES),
+        SeismicEvent.longitude_coord.between(lon - MATCH_BOX_DEGREES, lon + MATCH_BOX_DEGREES),
+        SeismicEvent.event_magnitude.between(magnitude - MATCH_MAGNITUDE_DELTA, magnitude + MATCH_MAGNITUDE_DELTA),
+        or_(SeismicEvent.event_key.is_(None), SeismicEvent.event_key.notin_(list(listed_keys)))
+    ).all()
+    
+    matches = []
+    for event in candidates:
+        distance = LocationAnalyzer.calculate_distance((lat, lon), (event.latitude_coord, event.longitude_coord))
+        if distance <= MATCH_DISTANCE_KM:
+            matches.append((abs(event.occurred_at - event_time), distance, event))
+    return matches
+
+
+def resolve_stored_event(event_key, revised_event_id=None):
+    """The stored event with this key, else the event the row was matched as revising"""
+    event = SeismicEvent.query.filter_by(event_key=event_key).first()
+    if event is None and revised_event_id:
+        event = SeismicEvent.query.get(revised_event_id)
+    return event
+
+
+def resolve_bulletin_events(bulletin_rows):
+    """Map each row to (event_key, stored event or None), matching exact keys first, then revisions
+    
+    Revision matching is one-to-one: the closest (row, event) pairs are taken
+    first, and a stored event claimed by one row is not offered to another.
+    """
+    keys = [canonical_event_key(bulletin_data) for bulletin_data in bulletin_rows]
+    known = {
+        event.event_key: event
+        for event in SeismicEvent.query.filter(SeismicEvent.event_key.in_(keys)).all()
+    } if keys else {}
+    
+    resolved = [known.get(event_key) for event_key in keys]
+    claimed = {event.id for event in resolved if event}
+    
+    pairs = [
+        (time_delta, distance, index, event)
+        for index, bulletin_data in enumerate(bulletin_rows) if resolved[index] is None
+        for time_delta, distance, event in revision_candidates(bulletin_data, listed_keys=keys)
+    ]
+    
+    for _, _, index, event in sorted(pairs, key=lambda pair: pair[:3]):
+        if resolved[index] is None and event.id not in claimed:
+            resolved[index] = event
+            claimed.add(event.id)
+    
+    return list(zip(keys, resolved))
+
+
+def event_revisions(event_id):
+    """Superseded bulletin versions of an event, oldest first, with how many users each revision newly reached"""
+    revisions = SeismicEventRevision.query.filter_by(event_id=event_id).order_by(SeismicEventRevision.revised_at).all()
+    return [revision.serialize() for revision in revisions]
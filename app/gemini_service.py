@@ -1,16 +1,83 @@
 import os
 from google import genai
 from google.genai import types
-from app import redis_client
+from app import metrics
+from app.cache import TTLCache
+from app.circuit_breaker import CircuitBreaker
+from app.summaries import find_summary, record_summary
+from flask import current_app, render_template
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import httpx
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Redis front cache for summaries, keyed by prompt hash;
+# generated summaries are also stored in the database
+SUMMARY_CACHE_DURATION = 3600
+
+# Hard per-call deadline; alerts fall back to the template summary past it
+GEMINI_TIMEOUT_SECONDS = 8
+SUMMARY_LOCK_WAIT = GEMINI_TIMEOUT_SECONDS + 2
+
+# Shared across workers: after 3 failures in 2 minutes, skip Gemini for 60 seconds
+gemini_breaker = CircuitBreaker('gemini', failure_threshold=3, reset_timeout=60, failure_window=120)
+
+# Workers waiting on another's Gemini call give up at once while the circuit is open
+summary_cache = TTLCache(
+    'gemini:summary', SUMMARY_CACHE_DURATION, lock_wait=SUMMARY_LOCK_WAIT,
+    abandon_wait=lambda: gemini_breaker.state() == 'open'
+)
+
+# Below this magnitude the prompt never asks for safety tips
+SAFETY_TIPS_MIN_MAGNITUDE = 4.0
+
+# Deterministic summary used instead of Gemini below the AI magnitude threshold
+LOCAL_SUMMARY_TEMPLATE = 'emails/local_summary.txt'
+
+# (upper bound, description) pairs for the local summary
+MAGNITUDE_STRENGTHS = ((4.0, 'minor'), (5.0, 'light'), (6.0, 'moderate'), (7.0, 'strong'))
+DEPTH_CLASSES = ((70, 'shallow'), (300, 'intermediate-depth'))
+
+# Keep-alive connections held open to the Gemini API per worker process
+GEMINI_POOL_SIZE = 10
+
+_summarizer = None
+_summarizer_pid = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer():
+    """Process-wide summarizer, built on first use and rebuilt after a fork"""
+    global _summarizer, _summarizer_pid
+    
+    if _summarizer is None or _summarizer_pid != os.getpid():
+        with _summarizer_lock:
+            if _summarizer is None or _summarizer_pid != os.getpid():
+                _summarizer = GeminiSummarizer(
+                    current_app.config['GEMINI_API_KEY'],
+                    ai_min_magnitude=current_app.config['AI_SUMMARY_MIN_MAGNITUDE']
+                )
+                _summarizer_pid = os.getpid()
+    return _summarizer
+
+
 class GeminiSummarizer:
     """Generate earthquake summaries using Gemini AI"""
     
-    def __init__(self, api_key):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key, ai_min_magnitude=0.0):
+        self.ai_min_magnitude = ai_min_magnitude
+        limits = httpx.Limits(max_connections=GEMINI_POOL_SIZE, max_keepalive_connections=GEMINI_POOL_SIZE)
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(client_args={'limits': limits}, async_client_args={'limits': limits})
+        )
         self.system_instruction = (
             "You are an AI assistant that summarizes PHIVOLCS earthquake reports. "
             "Your tone should be calm, and formal but still easy-to-digest — as if you're explaining the situation to everyday Filipinos. "
@@ -18,20 +85,143 @@ class GeminiSummarizer:
             "Never use decorations (like bold, italics, headers, or bullets). "
             "Respond in plain text only."
         )
+        self.generation_config = types.GenerateContentConfig(
+            system_instruction=self.system_instruction,
+            http_options=types.HttpOptions(
+                timeout=GEMINI_TIMEOUT_SECONDS * 1000,
+                retry_options=types.HttpRetryOptions(attempts=1)
+            )
+        )
+    
+    def create_summary(self, earthquake_data, include_safety_tips=True, event_id=None):
+        """Generate earthquake summary
+        
+        Read-through: Redis, then the event_summaries table, then Gemini.
+        New summaries are persisted when the event_id is known. Events below
+        ai_min_magnitude get a local template summary instead.
+        """
+        variant = self.summary_variant(earthquake_data, include_safety_tips)
+        
+        if self.uses_local_summary(earthquake_data):
+            loader = lambda: self._local_summary(earthquake_data, variant)
+        else:
+            prompt = self._build_prompt(earthquake_data, variant)
+            loader = lambda: find_summary(self._prompt_hash(prompt)) or self._generate_summary(prompt, variant, event_id)
+        
+        result = summary_cache.lookup(self._cache_key(earthquake_data, variant), loader)
+        if result.value is None:
+            return self._fallback_summary(earthquake_data)
+        
+        if result.cached:
+            logger.info(f"✅ Using cached {variant} summary")
+        return result.value
+    
+    async def create_summary_async(self, earthquake_data, include_safety_tips=True, event_id=None):
+        """Generate earthquake summary on the SDK's aio client
+        
+        Shares the summary cache and table with create_summary but not its
+        cross-worker lock, so concurrent misses may each call Gemini. Use the
+        summarizer from a single event loop; its async HTTP pool is bound to that loop.
+        """
+        variant = self.summary_variant(earthquake_data, include_safety_tips)
+        cache_key = self._cache_key(earthquake_data, variant)
+        
+        cached = await asyncio.to_thread(summary_cache.peek, cache_key)
+        if cached is not None:
+            logger.info(f"✅ Using cached {variant} summary")
+            return cached
+        
+        if self.uses_local_summary(earthquake_data):
+            summary = self._local_summary(earthquake_data, variant)
+            await asyncio.to_thread(summary_cache.put, cache_key, summary)
+            return summary
+        
+        prompt = self._build_prompt(earthquake_data, variant)
+        stored = await asyncio.to_thread(find_summary, self._prompt_hash(prompt))
+        if stored:
+            await asyncio.to_thread(summary_cache.put, cache_key, stored)
+            return stored
+        
+        if not await asyncio.to_thread(gemini_breaker.allow):
+            logger.warning("⚠️ Gemini circuit open, using fallback summary")
+            metrics.increment('gemini_short_circuited')
+            return self._fallback_summary(earthquake_data)
+        
+        try:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(
+                self.client.aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    config=self.generation_config,
+                    contents=prompt
+                ),
+                timeout=GEMINI_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            logger.error(f"❌ Gemini API error: {e}", exc_info=True)
+            await asyncio.to_thread(gemini_breaker.record_failure)
+            return self._fallback_summary(earthquake_data)
+        
+        await asyncio.to_thread(gemini_breaker.record_success)
+        await asyncio.to_thread(self._store_response, prompt, variant, event_id, response, started)
+        await asyncio.to_thread(summary_cache.put, cache_key, response.text)
+        return response.text
     
-    def create_summary(self, earthquake_data, include_safety_tips=True):
-        """Generate earthquake summary"""
+    def precompute_summaries(self, earthquake_data, event_id=None):
+        """Generate every distinct summary variant for an event concurrently"""
+        variants = {
+            self.summary_variant(earthquake_data, include_tips): include_tips
+            for include_tips in (False, True)
+        }
+        app = current_app._get_current_object()
         
+        def generate(include_tips):
+            with app.app_context():
+                return self.create_summary(earthquake_data, include_tips, event_id=event_id)
+        
+        with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+            return dict(zip(variants, executor.map(generate, variants.values())))
+    
+    def summary_variant(self, earthquake_data, include_safety_tips):
+        """Safety tips only change the prompt from magnitude 4.0 up"""
         magnitude_float = self._parse_magnitude(earthquake_data['magnitude'])
+        return 'tips' if magnitude_float >= SAFETY_TIPS_MIN_MAGNITUDE and include_safety_tips else 'plain'
+    
+    def uses_local_summary(self, earthquake_data):
+        """Whether this event is summarized locally instead of by Gemini"""
+        return self._parse_magnitude(earthquake_data['magnitude']) < self.ai_min_magnitude
+    
+    def _local_summary(self, earthquake_data, variant):
+        """Deterministic five-sentence summary rendered from a template"""
+        magnitude = self._parse_magnitude(earthquake_data['magnitude'])
+        depth = self._parse_magnitude(earthquake_data['depth']) if earthquake_data.get('depth') else None
         
+        text = render_template(
+            LOCAL_SUMMARY_TEMPLATE,
+            magnitude=earthquake_data['magnitude'],
+            magnitude_value=magnitude,
+            strength=next((label for limit, label in MAGNITUDE_STRENGTHS if magnitude < limit), 'major'),
+            depth=depth,
+            depth_class=next((label for limit, label in DEPTH_CLASSES if depth is not None and depth < limit), 'deep'),
+            date_time=earthquake_data['date_time'],
+            location=earthquake_data['location'],
+            variant=variant
+        )
+        metrics.increment('llm_calls_avoided')
+        
+        paragraphs = (" ".join(paragraph.split()) for paragraph in text.split("\n\n"))
+        return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+    
+    def _build_prompt(self, earthquake_data, variant):
+        """Prompt for one summary variant"""
         magnitude_condition = ""
-        if magnitude_float >= 4.0 and include_safety_tips:
+        if variant == 'tips':
             magnitude_condition = (
                 "Since the magnitude is 4.0 or higher, "
                 "include 2 short, simple, and relevant safety tips for the affected areas. "
             )
         
-        contents = (
+        return (
             "TASK:\n"
             "Summarize the following earthquake information in exactly 5 sentences. "
             "Make it easy to understand and reassuring in tone. "
@@ -44,29 +234,59 @@ class GeminiSummarizer:
             f"- Magnitude: {earthquake_data['magnitude']}\n"
             f"- Location: {earthquake_data['location']}\n"
         )
+    
+    def _generate_summary(self, prompt, variant, event_id):
+        """Ask Gemini for one summary variant; returns None on failure or while the circuit is open"""
+        if not gemini_breaker.allow():
+            logger.warning("⚠️ Gemini circuit open, using fallback summary")
+            metrics.increment('gemini_short_circuited')
+            return None
         
         try:
-            cache_key = f"{earthquake_data.get('detail_link', earthquake_data['date_time'])}-summary"
-            cached = self._get_cache(cache_key)
-            if cached:
-                logger.info("✅ Using cached summary")
-                return cached
-            
+            started = time.perf_counter()
             response = self.client.models.generate_content(
-                model="gemini-2.0-flash",  # Fixed model name
-                config=types.GenerateContentConfig(system_instruction=self.system_instruction),
-                contents=contents
+                model=GEMINI_MODEL,
+                config=self.generation_config,
+                contents=prompt
             )
-            
-            summary = response.text
-            self._set_cache(cache_key, summary)
-            
-            logger.info("✅ Generated new summary with Gemini")
-            return summary
-        
         except Exception as e:
             logger.error(f"❌ Gemini API error: {e}", exc_info=True)
-            return self._fallback_summary(earthquake_data)
+            gemini_breaker.record_failure()
+            return None
+        
+        gemini_breaker.record_success()
+        self._store_response(prompt, variant, event_id, response, started)
+        return response.text
+    
+    def _store_response(self, prompt, variant, event_id, response, started):
+        """Log a fresh Gemini response and persist it with its latency and token usage"""
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        logger.info(f"✅ Generated new {variant} summary with Gemini in {latency_ms} ms")
+        
+        if event_id is None or not response.text:
+            return
+        
+        usage = response.usage_metadata
+        record_summary(
+            event_id=event_id,
+            variant=variant,
+            model_name=GEMINI_MODEL,
+            prompt_hash=self._prompt_hash(prompt),
+            summary_text=response.text,
+            latency_ms=latency_ms,
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None
+        )
+    
+    def _prompt_hash(self, prompt):
+        """Identifies a summary by everything that shapes the model's answer"""
+        payload = f"{GEMINI_MODEL}\n{self.system_instruction}\n{prompt}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _cache_key(self, earthquake_data, variant):
+        """Keyed on the prompt, so link-less or revised events never reuse another summary"""
+        source = 'local' if self.uses_local_summary(earthquake_data) else 'ai'
+        return f"{source}:{self._prompt_hash(self._build_prompt(earthquake_data, variant))}"
     
     def _parse_magnitude(self, magnitude_str):
         """Extract numeric magnitude"""
@@ -82,21 +302,3 @@ class GeminiSummarizer:
             f"Please stay alert and follow safety protocols. "
             f"Monitor official updates for more information."
         )
-    
-    def _get_cache(self, key):
-        """Get from Redis cache"""
-        try:
-            if redis_client:
-                value = redis_client.get(key)
-                return value.decode('utf-8') if value else None
-        except Exception as e:
-            logger.error(f"Cache get error: {e}")
-            return None
-    
-    def _set_cache(self, key, value, expiry=3600):
-        """Set to Redis cache"""
-        try:
-            if redis_client:
-                redis_client.setex(key, expiry, value)
-        except Exception as e:
-            logger.error(f"Cache set error: {e}")
\ No newline at end of file
@@ -1,9 +1,77 @@
 from geopy.distance import geodesic
-from app.ph_locations import get_coordinates
+from app.ph_locations import PHILIPPINE_LOCATIONS, get_coordinates
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+import numpy as np
+import math
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Conservative km-per-degree so bounding boxes never undershoot the true radius
+KM_PER_DEGREE = 110.0
+
+# Mean Earth radius used by the haversine pass
+EARTH_RADIUS_KM = 6371.0088
+
+# Date formats seen in PHIVOLCS bulletins, after dropping the dash and PST suffix
+EVENT_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%d %B %Y %I:%M %p", "%d %b %Y %I:%M %p")
+
+# Haversine deviates from the WGS-84 geodesic by at most ~0.56%
+HAVERSINE_TOLERANCE = 0.006
+
+
+class MonitoredLocationIndex:
+    """Grid-bucketed spatial index over monitored city coordinates"""
+    
+    def __init__(self, locations, cell_degrees=1.0):
+        self.cell_degrees = cell_degrees
+        self.buckets = defaultdict(list)
+        
+        for province, cities in locations.items():
+            for city, coords in cities.items():
+                self.buckets[self._cell(coords[0], coords[1])].append((province, city, coords))
+    
+    def _cell(self, lat, lon):
+        """Grid cell containing a coordinate"""
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+    
+    def candidates_within(self, quake_coords, radius_km):
+        """Return (province, city, coords) entries inside the radius bounding box"""
+        lat, lon = quake_coords
+        lat_span = radius_km / KM_PER_DEGREE
+        widest_lat = min(abs(lat) + lat_span, 89.0)
+        lon_span = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest_lat)))
+        
+        min_cell = self._cell(lat - lat_span, lon - lon_span)
+        max_cell = self._cell(lat + lat_span, lon + lon_span)
+        
+        candidates = []
+        for lat_cell in range(min_cell[0], max_cell[0] + 1):
+            for lon_cell in range(min_cell[1], max_cell[1] + 1):
+                for province, city, coords in self.buckets.get((lat_cell, lon_cell), ()):
+                    if abs(coords[0] - lat) <= lat_span and abs(coords[1] - lon) <= lon_span:
+                        candidates.append((province, city, coords))
+        
+        return candidates
+
+
+_location_index = None
+
+# Per-event city distance tables, most recently used last
+_event_distance_tables = OrderedDict()
+MAX_CACHED_EVENTS = 32
+
+
+def get_location_index():
+    """Lazily build the process-wide index of monitored locations"""
+    global _location_index
+    
+    if _location_index is None:
+        _location_index = MonitoredLocationIndex(PHILIPPINE_LOCATIONS)
+    return _location_index
+
+
 class LocationAnalyzer:
     """Analyze earthquake locations and affected areas"""
     
@@ -24,6 +92,18 @@ class LocationAnalyzer:
         except:
             return None, None
     
+    @staticmethod
+    def parse_event_time(date_time_text):
+        """Parse a bulletin date/time string, returning None if the format is unknown"""
+        dt_string = ' '.join(date_time_text.replace(' - ', ' ').replace(' PST', '').split())
+        
+        for time_format in EVENT_TIME_FORMATS:
+            try:
+                return datetime.strptime(dt_string, time_format)
+            except ValueError:
+                continue
+        return None
+    
     @staticmethod
     def calculate_affected_radius(magnitude):
         """Calculate impact radius based on magnitude"""
@@ -35,6 +115,71 @@ class LocationAnalyzer:
         """Calculate distance between two points in km"""
         return geodesic(coord1, coord2).kilometers
     
+    @staticmethod
+    def distances_from(quake_coords, coord_array, radius_km=None):
+        """Vectorized haversine distances in km from the epicenter to each (lat, lon) row
+        
+        When radius_km is given, points close enough to the boundary for the
+        haversine error to matter are refined with an exact geodesic.
+        """
+        coords = np.asarray(coord_array, dtype=float).reshape(-1, 2)
+        quake_lat, quake_lon = np.radians(quake_coords[0]), np.radians(quake_coords[1])
+        lats = np.radians(coords[:, 0])
+        lons = np.radians(coords[:, 1])
+        
+        half_chord = (
+            np.sin((lats - quake_lat) / 2) ** 2
+            + np.cos(quake_lat) * np.cos(lats) * np.sin((lons - quake_lon) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0.0, 1.0)))
+        
+        if radius_km is not None:
+            near_boundary = np.abs(distances - radius_km) <= np.maximum(distances, radius_km) * HAVERSINE_TOLERANCE
+            for index in np.flatnonzero(near_boundary):
+                distances[index] = LocationAnalyzer.calculate_distance(tuple(coords[index]), quake_coords)
+        
+        return distances
+    
+    @staticmethod
+    def build_distance_table(quake_coords, radius_km):
+        """Map each monitored (province, city) within the radius to its exact distance in km"""
+        if not quake_coords or quake_coords[0] is None or quake_coords[1] is None:
+            return {}
+        
+        candidates = get_location_index().candidates_within(quake_coords, radius_km)
+        if not candidates:
+            return {}
+        
+        approximate = LocationAnalyzer.distances_from(quake_coords, [coords for _, _, coords in candidates])
+        table = {}
+        
+        for (province, city, coords), approx_km in zip(candidates, approximate):
+            if approx_km > radius_km * (1 + HAVERSINE_TOLERANCE):
+                continue
+            
+            distance = LocationAnalyzer.calculate_distance(coords, quake_coords)
+            if distance <= radius_km:
+                table[(province, city)] = distance
+        
+        return table
+    
+    @staticmethod
+    def get_event_distance_table(event_key, quake_coords, radius_km):
+        """Return the distance table for an event, computing it once per event"""
+        cache_key = (event_key, tuple(quake_coords), radius_km)
+        
+        if cache_key in _event_distance_tables:
+            _event_distance_tables.move_to_end(cache_key)
+            return _event_distance_tables[cache_key]
+        
+        table = LocationAnalyzer.build_distance_table(quake_coords, radius_km)
+        _event_distance_tables[cache_key] = table
+        
+        while len(_event_distance_tables) > MAX_CACHED_EVENTS:
+            _event_distance_tables.popitem(last=False)
+        
+        return table
+    
     @staticmethod
     def is_location_affected(province, city, quake_coords, radius_km):
         """Check if a location is within affected radius"""
@@ -43,5 +188,5 @@ class LocationAnalyzer:
         if not city_coords or not quake_coords or not quake_coords[0] or not quake_coords[1]:
             return False
         
-        distance = LocationAnalyzer.calculate_distance(city_coords, quake_coords)
-        return distance <= radius_km
\ No newline at end of file
+        distance = LocationAnalyzer.distances_from(quake_coords, [city_coords], radius_km)[0]
+        return bool(distance <= radius_km)
@@ -0,0 +1,75 @@
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """Expiring Redis lock (SET NX PX) that only its holder can release"""
+    
+    def __init__(self, name, ttl_seconds):
+        self.key = f"lock:{name}"
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.token = None
+    
+    def acquire(self):
+        """Try once to take the lock; returns True on success
+        
+        Raises if Redis is unreachable so callers can choose how to degrade.
+        """
+        from app import redis_client
+        
+        if not redis_client:
+            raise RuntimeError("Redis is not configured")
+        
+        token = uuid.uuid4().hex
+        if redis_client.set(self.key, token, nx=True, px=self.ttl_ms):
+            self.token = token
+            return True
+        return False
+    
+    def release(self):
+        """Release the lock if we still hold it"""
+        from app import redis_client
+        
+        if not self.token:
+            return
+        
+        try:
+            redis_client.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            logger.error(f"Lock release error for {self.key}: {e}")
+        finally:
+            self.token = None
+
+
+class FencedLock(RedisLock):
+    """Lease lock that hands each new holder a strictly increasing fencing token
+    
+    A holder whose lease expired mid-work can still be running. Guard writes
+    with the fence (e.g. UPDATE ... WHERE fence <= :fence) so a stale holder's
+    writes are rejected once a newer holder has taken over.
+    
+    Locks whose resource can change name share a counter through fence_name,
+    so tokens keep increasing across the rename.
+    """
+    
+    def __init__(self, name, ttl_seconds, fence_name=None):
+        super().__init__(name, ttl_seconds)
+        self.fence_key = f"fence:{fence_name or name}"
+        self.fence = None
+    
+    def acquire(self):
+        from app import redis_client
+        
+        if not super().acquire():
+            return False
+        self.fence = int(redis_client.incr(self.fence_key))
+        return True
@@ -0,0 +1,61 @@
+from app import email_service
+from flask import current_app
+import smtplib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the SMTP session is unusable and must be reopened
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+# Attempts per message, counting the first send
+SEND_ATTEMPTS = 2
+
+
+def send_bulk(messages, batch_size=None):
+    """Send messages over persistent SMTP connections, one connection per batch
+    
+    Returns a list of booleans, one per message, telling whether it was sent.
+    """
+    batch_size = batch_size or current_app.config['MAIL_BATCH_SIZE']
+    results = []
+    
+    for start in range(0, len(messages), batch_size):
+        results.extend(_send_batch(messages[start:start + batch_size]))
+    
+    return results
+
+
+def _send_batch(batch):
+    """Send a batch over one authenticated connection"""
+    results = [False] * len(batch)
+    
+    try:
+        with email_service.connect() as connection:
+            for index, message in enumerate(batch):
+                results[index] = _send_with_reconnect(connection, message)
+    except Exception as error:
+        logger.error(f"❌ SMTP connection error: {error}")
+    
+    return results
+
+
+def _send_with_reconnect(connection, message):
+    """Send one message, reopening the connection if the server dropped it"""
+    for attempt in range(SEND_ATTEMPTS):
+        try:
+            connection.send(message)
+            logger.info(f"✅ Notification sent to {', '.join(message.recipients)}")
+            return True
+        except CONNECTION_ERRORS as error:
+            logger.warning(f"SMTP connection lost ({error}), reconnecting")
+            try:
+                connection.host = connection.configure_host()
+            except Exception as reconnect_error:
+                logger.error(f"❌ SMTP reconnect failed: {reconnect_error}")
+                raise
+        except Exception as error:
+            logger.error(f"❌ Failed to send email to {', '.join(message.recipients)}: {error}")
+            return False
+    
+    return False
@@ -0,0 +1,29 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'metrics:counters'
+
+
+def increment(name, amount=1):
+    """Increment a shared counter in Redis"""
+    from app import redis_client
+
+    try:
+        if redis_client:
+            redis_client.hincrby(METRICS_KEY, name, amount)
+    except Exception as e:
+        logger.error(f"Metric increment error: {e}")
+
+
+def snapshot():
+    """Return all counters as a dict of ints"""
+    from app import redis_client
+
+    try:
+        if redis_client:
+            counters = redis_client.hgetall(METRICS_KEY)
+            return {key.decode('utf-8'): int(value) for key, value in counters.items()}
+    except Exception as e:
+        logger.error(f"Metric snapshot error: {e}")
+    return {}
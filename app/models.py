@@ -15,6 +15,7 @@ class User(database.Model):
     is_active = database.Column(database.Boolean, default=True)
     
     notification_settings = database.relationship('NotificationSettings', backref='owner', uselist=False, cascade='all, delete-orphan')
+    subscription_entry = database.relationship('SubscriptionIndex', uselist=False, cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Hash and set the user's password"""
@@ -64,11 +65,26 @@ class NotificationSettings(database.Model):
             'range_km': self.proximity_range_km
         }
 
+class SubscriptionIndex(database.Model):
+    __tablename__ = 'subscription_index'
+    __table_args__ = (
+        database.Index('ix_subscription_city_threshold', 'monitored_city', 'magnitude_threshold'),
+    )
+    
+    # Effective monitored location and thresholds, see app.subscriptions
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), primary_key=True)
+    monitored_province = database.Column(database.String(100))
+    monitored_city = database.Column(database.String(100))
+    magnitude_threshold = database.Column(database.Float, nullable=False)
+    proximity_range_km = database.Column(database.Float, nullable=False)
+    updated_at = database.Column(database.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
 class SeismicEvent(database.Model):
     __tablename__ = 'seismic_events'
     
     id = database.Column(database.Integer, primary_key=True)
-    event_identifier = database.Column(database.String(200), unique=True, nullable=False, index=True)
+    event_key = database.Column(database.CHAR(32), unique=True, index=True)  # See app.events.canonical_event_key
+    event_identifier = database.Column(database.String(200), nullable=False)
     event_magnitude = database.Column(database.Float, nullable=False)
     event_location = database.Column(database.String(300), nullable=False)
     latitude_coord = database.Column(database.Float)
@@ -76,6 +92,11 @@ class SeismicEvent(database.Model):
     depth_km = database.Column(database.Float)
     occurred_at = database.Column(database.DateTime, nullable=False)
     has_been_processed = database.Column(database.Boolean, default=False, nullable=False)
+    dispatched_at = database.Column(database.DateTime)
+    first_seen_at = database.Column(database.DateTime)
+    first_alert_at = database.Column(database.DateTime)
+    processing_fence = database.Column(database.Integer)
+    bulletin_data = database.Column(database.JSON)  # Latest bulletin row, for re-queued deliveries
     recorded_at = database.Column(database.DateTime, default=datetime.utcnow, nullable=False)
 
     def serialize(self):
@@ -87,4 +108,84 @@ class SeismicEvent(database.Model):
             'coordinates': {'lat': self.latitude_coord, 'lon': self.longitude_coord},
             'depth': self.depth_km,
             'time': self.occurred_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class SeismicEventRevision(database.Model):
+    __tablename__ = 'seismic_event_revisions'
+    
+    id = database.Column(database.Integer, primary_key=True)
+    event_id = database.Column(database.Integer, database.ForeignKey('seismic_events.id'), nullable=False, index=True)
+    event_key = database.Column(database.CHAR(32))
+    event_identifier = database.Column(database.String(200), nullable=False)
+    event_magnitude = database.Column(database.Float, nullable=False)
+    event_location = database.Column(database.String(300), nullable=False)
+    latitude_coord = database.Column(database.Float)
+    longitude_coord = database.Column(database.Float)
+    depth_km = database.Column(database.Float)
+    occurred_at = database.Column(database.DateTime, nullable=False)
+    newly_notified = database.Column(database.Integer, default=0, nullable=False)
+    revised_at = database.Column(database.DateTime, default=datetime.utcnow, nullable=False)
+
+    def serialize(self):
+        return {
+            'event_id': self.event_id,
+            'previous_event_id': self.event_identifier,
+            'magnitude': self.event_magnitude,
+            'location': self.event_location,
+            'coordinates': {'lat': self.latitude_coord, 'lon': self.longitude_coord},
+            'depth': self.depth_km,
+            'time': self.occurred_at.isoformat(),
+            'newly_notified': self.newly_notified,
+            'revised': self.revised_at.isoformat()
+        }
+
+class NotificationDelivery(database.Model):
+    __tablename__ = 'notification_deliveries'
+    __table_args__ = (
+        database.UniqueConstraint('event_id', 'user_id', name='uq_delivery_event_user'),
+    )
+    
+    id = database.Column(database.Integer, primary_key=True)
+    event_id = database.Column(database.Integer, database.ForeignKey('seismic_events.id'), nullable=False, index=True)
+    user_id = database.Column(database.Integer, database.ForeignKey('users.id'), nullable=False)
+    status = database.Column(database.String(20), default='pending', nullable=False)
+    attempts = database.Column(database.Integer, default=0, nullable=False)
+    claim_token = database.Column(database.String(32), index=True)
+    claimed_at = database.Column(database.DateTime)
+    created_at = database.Column(database.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = database.Column(database.DateTime)
+
+    def serialize(self):
+        return {
+            'event_id': self.event_id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'created': self.created_at.isoformat(),
+            'sent': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class EventSummary(database.Model):
+    __tablename__ = 'event_summaries'
+    
+    id = database.Column(database.Integer, primary_key=True)
+    event_id = database.Column(database.Integer, database.ForeignKey('seismic_events.id'), nullable=False, index=True)
+    variant = database.Column(database.String(20), nullable=False)
+    model_name = database.Column(database.String(100), nullable=False)
+    prompt_hash = database.Column(database.String(64), unique=True, nullable=False, index=True)
+    summary_text = database.Column(database.Text, nullable=False)
+    latency_ms = database.Column(database.Integer)
+    prompt_tokens = database.Column(database.Integer)
+    output_tokens = database.Column(database.Integer)
+    created_at = database.Column(database.DateTime, default=datetime.utcnow, nullable=False)
+
+    def serialize(self):
+        return {
+            'event_id': self.event_id,
+            'variant': self.variant,
+            'model': self.model_name,
+            'latency_ms': self.latency_ms,
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'created': self.created_at.isoformat()
+        }
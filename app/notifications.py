@@ -0,0 +1,66 @@
+from flask import render_template
+from flask_mail import Message
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Plain-text body shared by every earthquake notification
+ALERT_TEMPLATE = 'emails/earthquake_alert.txt'
+
+# Placeholders rendered into the template, then split out for per-user substitution
+NAME_MARKER = '\x00full_name\x00'
+LOCATION_MARKER = '\x00monitored_location\x00'
+
+
+def monitored_location(user, settings):
+    """The (province, city) a user's alerts are matched against"""
+    if settings.monitor_location_type == 'near_me':
+        return user.user_province, user.user_city
+    return settings.alternate_province, settings.alternate_city
+
+
+class NotificationRenderer:
+    """Build notification emails for one event
+    
+    The summary and the rendered template are produced once per summary
+    variant; each user only costs two string joins.
+    """
+    
+    def __init__(self, bulletin_data, summarizer, event_id=None):
+        self.bulletin_data = bulletin_data
+        self.summarizer = summarizer
+        self.event_id = event_id
+        self.subject = f"🚨 Earthquake Alert - Magnitude {bulletin_data['magnitude']}"
+        self._segments = {}
+    
+    def build(self, user, settings):
+        """Compose the notification email for one user"""
+        variant = self.summarizer.summary_variant(self.bulletin_data, settings.add_safety_tips)
+        head, middle, tail = self._get_segments(variant)
+        province, city = monitored_location(user, settings)
+        
+        return Message(
+            subject=self.subject,
+            recipients=[user.email_address],
+            body=f"{head}{user.full_name}{middle}{city}, {province}{tail}"
+        )
+    
+    def _get_segments(self, variant):
+        """Template text around the per-user fields, rendered once per variant"""
+        segments = self._segments.get(variant)
+        
+        if segments is None:
+            summary = self.summarizer.create_summary(self.bulletin_data, variant == 'tips', event_id=self.event_id)
+            body = render_template(
+                ALERT_TEMPLATE,
+                bulletin=self.bulletin_data,
+                summary=summary,
+                ai_generated=not self.summarizer.uses_local_summary(self.bulletin_data),
+                full_name=NAME_MARKER,
+                monitored_location=LOCATION_MARKER
+            )
+            head, rest = body.split(NAME_MARKER, 1)
+            middle, tail = rest.split(LOCATION_MARKER, 1)
+            segments = self._segments[variant] = (head, middle, tail)
+        
+        return segments
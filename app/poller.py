@@ -0,0 +1,92 @@
+from app import database
+from app.api import fetch_bulletin_if_changed, remember_bulletin_state
+from app.tasks import EVENT_LEASE_SECONDS, process_bulletin_events, recent_bulletin_events, unhandled_bulletin_events
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keep polling at the fast interval this long after the last recent event
+ACTIVITY_WINDOW_SECONDS = 30 * 60
+
+# Each quiet poll stretches the interval by this factor, up to the slow interval
+QUIET_BACKOFF = 1.5
+
+
+class BulletinPoller:
+    """Long-running PHIVOLCS poller that enqueues processing only for new events
+    
+    Uses conditional GETs through fetch_bulletin_if_changed. Polls every
+    fast_interval seconds while the bulletin shows recent activity, and backs
+    off towards slow_interval when it is quiet or unreachable.
+    """
+    
+    def __init__(self, fast_interval=15, slow_interval=120):
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.interval = fast_interval
+        self.last_activity = None
+        self.last_enqueued_hash = None
+        self.last_enqueued_at = None
+        self.running = False
+    
+    def run(self):
+        """Poll until stop() is called"""
+        self.running = True
+        logger.info(f"🔍 Bulletin poller started ({self.fast_interval}s-{self.slow_interval}s)")
+        
+        while self.running:
+            try:
+                self.poll_once()
+            except Exception as error:
+                logger.error(f"❌ Poll failed: {error}", exc_info=True)
+            finally:
+                database.session.remove()
+            
+            self.interval = self.next_interval()
+            self._sleep(self.interval)
+        
+        logger.info("Bulletin poller stopped")
+    
+    def stop(self):
+        self.running = False
+    
+    def poll_once(self):
+        """Fetch the bulletin once; returns True if new events were enqueued"""
+        bulletin = fetch_bulletin_if_changed()
+        seen_at = time.time()
+        
+        if bulletin is None or not bulletin.changed:
+            return False
+        
+        # Already handed to a worker that has not finished yet; once its lease
+        # would have run out, rows still unhandled are enqueued again
+        if bulletin.state['content_hash'] == self.last_enqueued_hash and \
+           time.monotonic() - self.last_enqueued_at < EVENT_LEASE_SECONDS:
+            return False
+        
+        events = list(recent_bulletin_events(bulletin.events))
+        if events:
+            self.last_activity = time.monotonic()
+        
+        if not unhandled_bulletin_events(events):
+            remember_bulletin_state(bulletin.state)
+            return False
+        
+        process_bulletin_events.delay(events, bulletin.state, seen_at)
+        self.last_enqueued_hash = bulletin.state['content_hash']
+        self.last_enqueued_at = time.monotonic()
+        logger.info(f"📥 New bulletin events enqueued ({len(events)} recent rows)")
+        return True
+    
+    def next_interval(self):
+        """Fast while there is recent activity, otherwise back off towards the slow interval"""
+        if self.last_activity is not None and time.monotonic() - self.last_activity < ACTIVITY_WINDOW_SECONDS:
+            return self.fast_interval
+        return min(self.interval * QUIET_BACKOFF, self.slow_interval)
+    
+    def _sleep(self, seconds):
+        """Sleep in short steps so stop() takes effect promptly"""
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
@@ -1,9 +1,12 @@
 from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash, session
 from datetime import datetime
-from app import database
+from app import database, metrics
 from app.models import User, NotificationSettings, SeismicEvent
 from app.ph_locations import get_all_provinces, get_cities_in_province
 from app.api import get_latest_earthquake
+from app.delivery import delivery_summary
+from app.summaries import event_summaries
+from app.events import event_revisions
 from app.cities import PHILIPPINE_GEOGRAPHY, REGIONS_LIST
 
 bp = Blueprint('web', __name__)
@@ -189,13 +192,21 @@ def update_settings(user_id=None):
 
 @bp.route('/api/status')
 def application_status():
+    from app.gemini_service import gemini_breaker
+    
     return jsonify({
         'status': 'operational',
         'timestamp': datetime.now().isoformat(),
-        'service': 'index0-earthquake-monitor'
+        'service': 'index0-earthquake-monitor',
+        'gemini_circuit': gemini_breaker.state()
     })
 
 
+@bp.route('/api/metrics')
+def application_metrics():
+    return jsonify(metrics.snapshot())
+
+
 @bp.route('/api/earthquake/latest')
 def latest_earthquake():
     return get_latest_earthquake()
@@ -300,7 +311,7 @@ def test_notification():
     
     # If criteria met, send actual test email
     if location_matches:
-        from app.gemini_service import GeminiSummarizer
+        from app.gemini_service import get_summarizer
         from app import email_service
         from flask_mail import Message
         from datetime import datetime
@@ -318,9 +329,7 @@ def test_notification():
             }
             
             # Generate AI summary
-            from flask import current_app
-            summarizer = GeminiSummarizer(current_app.config['GEMINI_API_KEY'])
-            summary = summarizer.create_summary(test_earthquake_data, settings.add_safety_tips)
+            summary = get_summarizer().create_summary(test_earthquake_data, settings.add_safety_tips)
             
             # Compose email
             subject = f"🧪 TEST - Earthquake Alert - Magnitude {test_magnitude}"
@@ -405,4 +414,30 @@ Stay safe!"""
 def api_events():
     """Get recent seismic events"""
     events = SeismicEvent.query.order_by(SeismicEvent.occurred_at.desc()).limit(20).all()
-    return jsonify([event.serialize() for event in events])
\ No newline at end of file
+    return jsonify([event.serialize() for event in events])
+
+
+@bp.route('/api/events/<int:event_id>/deliveries')
+def api_event_deliveries(event_id):
+    """Delivery status counts and latency for one event"""
+    summary = delivery_summary(event_id)
+    
+    if not summary:
+        return jsonify({'success': False, 'error': 'Event not found'}), 404
+    return jsonify(summary)
+
+
+@bp.route('/api/events/<int:event_id>/summaries')
+def api_event_summaries(event_id):
+    """Stored AI summaries for one event with their generation latency"""
+    if not SeismicEvent.query.get(event_id):
+        return jsonify({'success': False, 'error': 'Event not found'}), 404
+    return jsonify(event_summaries(event_id))
+
+
+@bp.route('/api/events/<int:event_id>/revisions')
+def api_event_revisions(event_id):
+    """Earlier bulletin versions of one event that PHIVOLCS has since revised"""
+    if not SeismicEvent.query.get(event_id):
+        return jsonify({'success': False, 'error': 'Event not found'}), 404
+    return jsonify(event_revisions(event_id))
\ No newline at end of file
@@ -0,0 +1,120 @@
+from app import database
+from app.models import User, NotificationSettings, SubscriptionIndex, NotificationDelivery
+from app.notifications import monitored_location
+from sqlalchemy import event, exists
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while streaming subscribers
+SUBSCRIBER_BATCH_SIZE = 1000
+
+
+def index_subscription(user, settings, session=None):
+    """Write a user's effective monitored city, threshold and range to the subscription index
+    
+    Not committed, so it is saved in the same transaction as the settings change.
+    """
+    session = session or database.session
+    province, city = monitored_location(user, settings)
+    entry = session.get(SubscriptionIndex, user.id) or SubscriptionIndex(user_id=user.id)
+    
+    entry.monitored_province = province
+    entry.monitored_city = city
+    entry.magnitude_threshold = settings.magnitude_threshold
+    entry.proximity_range_km = settings.proximity_range_km
+    session.add(entry)
+    return entry
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_subscription_changes(session, flush_context):
+    """Remember which users' index rows a flush made stale"""
+    changed = session.info.setdefault('subscription_changes', set())
+    
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User) and instance not in session.deleted:
+            changed.add(instance.id)
+        elif isinstance(instance, NotificationSettings):
+            changed.add(instance.user_id)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _reindex_changed_subscriptions(session, flush_context):
+    """Re-index users whose account or settings changed; the rows go out with the next flush
+    
+    Keeps the index in step with every write, not only the settings views.
+    """
+    changed = session.info.pop('subscription_changes', set())
+    
+    with session.no_autoflush:
+        for user_id in changed:
+            user = session.get(User, user_id)
+            settings = session.query(NotificationSettings).filter_by(user_id=user_id).first()
+            entry = session.get(SubscriptionIndex, user_id)
+            
+            if user and settings:
+                index_subscription(user, settings, session)
+            elif entry:
+                session.delete(entry)
+
+
+def check_subscription_index():
+    """Rebuild the index if it is missing users that have notification settings
+    
+    Returns False when a rebuild was needed, e.g. before migrate_subscription_index.py
+    was run or after rows were written with the listeners bypassed.
+    """
+    settings_count = NotificationSettings.query.count()
+    indexed_count = SubscriptionIndex.query.count()
+    
+    if settings_count == indexed_count:
+        return True
+    
+    logger.error(f"❌ Subscription index has {indexed_count} rows for {settings_count} subscribers; rebuilding")
+    rebuild_subscription_index()
+    return False
+
+
+def iter_indexed_subscribers(magnitude, candidate_cities, exclude_event_id=None):
+    """Stream (user_id, province, city, range_km) for active subscribers an event can reach
+    
+    A range scan of the (city, threshold) index over the affected cities. With
+    exclude_event_id, users already in that event's delivery ledger are left
+    out by an anti-join.
+    """
+    query = database.session.query(
+        SubscriptionIndex.user_id,
+        SubscriptionIndex.monitored_province,
+        SubscriptionIndex.monitored_city,
+        SubscriptionIndex.proximity_range_km
+    ).join(
+        User, User.id == SubscriptionIndex.user_id
+    ).filter(
+        SubscriptionIndex.monitored_city.in_(candidate_cities),
+        SubscriptionIndex.magnitude_threshold <= magnitude,
+        User.is_active == True
+    )
+    
+    if exclude_event_id is not None:
+        query = query.filter(~exists().where(
+            NotificationDelivery.event_id == exclude_event_id,
+            NotificationDelivery.user_id == SubscriptionIndex.user_id
+        ))
+    
+    return query.yield_per(SUBSCRIBER_BATCH_SIZE)
+
+
+def rebuild_subscription_index():
+    """Re-index every user with notification settings; returns the number of entries written"""
+    rows = database.session.query(User, NotificationSettings).join(
+        NotificationSettings, NotificationSettings.user_id == User.id
+    ).all()
+    
+    for user, settings in rows:
+        index_subscription(user, settings)
+    
+    database.session.commit()
+    logger.info(f"✅ Subscription index rebuilt for {len(rows)} users")
+    return len(rows)
@@ -0,0 +1,49 @@
+from app import database
+from app.models import EventSummary
+from sqlalchemy.exc import IntegrityError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def find_summary(prompt_hash):
+    """Stored summary text for an exact prompt, or None"""
+    try:
+        row = database.session.query(EventSummary.summary_text).filter(
+            EventSummary.prompt_hash == prompt_hash
+        ).first()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Summary lookup error: {e}")
+        database.session.rollback()
+        return None
+
+
+def record_summary(event_id, variant, model_name, prompt_hash, summary_text,
+                   latency_ms=None, prompt_tokens=None, output_tokens=None):
+    """Persist a generated summary; a concurrent insert of the same prompt is ignored"""
+    database.session.add(EventSummary(
+        event_id=event_id,
+        variant=variant,
+        model_name=model_name,
+        prompt_hash=prompt_hash,
+        summary_text=summary_text,
+        latency_ms=latency_ms,
+        prompt_tokens=prompt_tokens,
+        output_tokens=output_tokens
+    ))
+    
+    try:
+        database.session.commit()
+    except IntegrityError:
+        database.session.rollback()
+        logger.info(f"Summary for event {event_id} ({variant}) already stored")
+    except Exception as e:
+        database.session.rollback()
+        logger.error(f"Summary store error: {e}")
+
+
+def event_summaries(event_id):
+    """Stored summaries for an event with their LLM latency and token counts"""
+    summaries = EventSummary.query.filter_by(event_id=event_id).order_by(EventSummary.created_at).all()
+    return [summary.serialize() for summary in summaries]
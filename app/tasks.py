@@ -1,87 +1,55 @@
-from app import database, email_service, task_queue
-from app.models import User, NotificationSettings, SeismicEvent
-from app.api import fetch_latest_earthquake_raw
-from app.gemini_service import GeminiSummarizer
+from app import database, task_queue
+from app.models import User, NotificationSettings, SeismicEvent, SeismicEventRevision
+from app.api import fetch_bulletin_if_changed, remember_bulletin_state
+from app.gemini_service import get_summarizer
 from app.location_service import LocationAnalyzer
-from flask_mail import Message
+from app.mailer import send_bulk
+from app.async_mailer import send_bulk_async
+from app.delivery import record_pending_deliveries, claim_deliveries, complete_deliveries, record_first_alert, stalled_deliveries, unfinished_events, MAX_DELIVERY_ATTEMPTS
+from app.notifications import NotificationRenderer
+from app.subscriptions import check_subscription_index, iter_indexed_subscribers
+from app.locks import FencedLock
+from app.events import bulletin_event_fields, canonical_event_key, event_label, resolve_bulletin_events, resolve_stored_event
+from celery import chord, group
 from flask import current_app
-from datetime import datetime
+from sqlalchemy import or_
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Bulletin rows older than this are never treated as new events
+BULLETIN_LOOKBACK_MINUTES = 60
+BULLETIN_MAX_EVENTS = 50
+
+# Lease on an event's processing; writes after expiry are rejected by the fence
+EVENT_LEASE_SECONDS = 120
+
+# Events below this magnitude are never stored or alerted
+MIN_ALERT_MAGNITUDE = 3.0
+
+# PHIVOLCS publishes bulletin times in Philippine Standard Time
+PHILIPPINE_TIMEZONE = ZoneInfo('Asia/Manila')
+
 @task_queue.task(bind=True, max_retries=3, name='app.tasks.check_and_process_earthquakes')
 def check_and_process_earthquakes(self):
     """Periodic task to check for new earthquakes and send notifications"""
     logger.info("🔍 Checking for new earthquake bulletins...")
     
     try:
-        bulletin_data = fetch_latest_earthquake_raw()
+        bulletin = fetch_bulletin_if_changed()
         
-        if not bulletin_data:
+        if bulletin is None:
             logger.warning("No bulletin data retrieved")
             return "No data available"
         
-        event_id = f"{bulletin_data['date_time']}_{bulletin_data['location']}"
-        
-        existing_event = SeismicEvent.query.filter_by(event_identifier=event_id).first()
-        
-        if existing_event and existing_event.has_been_processed:
-            logger.info(f"Event {event_id} already processed")
-            return "Already processed"
-        
-        magnitude = LocationAnalyzer.parse_magnitude(bulletin_data['magnitude'])
-        
-        if magnitude < 3.0:
-            logger.info(f"Magnitude {magnitude} below minimum threshold")
-            return f"Magnitude {magnitude} too low"
-        
-        logger.info(f"⚠️ Significant event detected: Magnitude {magnitude}")
-        
-        lat, lon = LocationAnalyzer.parse_coordinates(
-            bulletin_data['latitude'],
-            bulletin_data['longitude']
-        )
-        
-        try:
-            dt_string = bulletin_data['date_time'].replace(' - ', ' ').replace(' PST', '')
-            event_time = datetime.strptime(dt_string, "%Y-%m-%d %H:%M:%S")
-        except:
-            event_time = datetime.now()
-        
-        if not existing_event:
-            depth = LocationAnalyzer.parse_magnitude(bulletin_data['depth'])
-            new_event = SeismicEvent(
-                event_identifier=event_id,
-                event_magnitude=magnitude,
-                event_location=bulletin_data['location'],
-                latitude_coord=lat,
-                longitude_coord=lon,
-                depth_km=depth,
-                occurred_at=event_time,
-                has_been_processed=False
-            )
-            database.session.add(new_event)
-            database.session.commit()
-            current_event = new_event
-        else:
-            current_event = existing_event
-        
-        # Process notifications with Flask app config
-        notifications_sent = process_notifications(
-            current_event, 
-            bulletin_data, 
-            (lat, lon), 
-            magnitude,
-            current_app.config['GEMINI_API_KEY']
-        )
-        
-        current_event.has_been_processed = True
-        database.session.commit()
+        if not bulletin.changed:
+            logger.info("Bulletin unchanged since last poll")
+            return "Bulletin unchanged"
         
-        result = f"✅ Event {event_id} processed: {notifications_sent} notifications sent"
-        logger.info(result)
-        return result
+        return ingest_bulletin_events(list(recent_bulletin_events(bulletin.events)), bulletin.state, time.time())
     
     except Exception as error:
         logger.error(f"❌ Error in monitoring task: {error}", exc_info=True)
@@ -89,93 +57,425 @@ def check_and_process_earthquakes(self):
         raise self.retry(exc=error, countdown=60)
 
 
-def process_notifications(event, bulletin_data, quake_coords, magnitude, gemini_api_key):
-    """Process and send notifications to affected users"""
+@task_queue.task(bind=True, max_retries=3, name='app.tasks.process_bulletin_events')
+def process_bulletin_events(self, bulletin_events, bulletin_state, seen_at=None):
+    """Handle recent bulletin rows the poller found; see app.poller"""
+    try:
+        return ingest_bulletin_events(bulletin_events, bulletin_state, seen_at)
     
-    all_users = User.query.filter_by(is_active=True).all()
-    sent_count = 0
+    except Exception as error:
+        logger.error(f"❌ Error processing bulletin events: {error}", exc_info=True)
+        database.session.rollback()
+        raise self.retry(exc=error, countdown=15)
+
+
+def ingest_bulletin_events(bulletin_events, bulletin_state, seen_at=None):
+    """Store and notify every recent bulletin row not handled yet, then remember the bulletin
     
-    summarizer = GeminiSummarizer(gemini_api_key)
-    impact_radius = LocationAnalyzer.calculate_affected_radius(magnitude)
+    seen_at is the epoch time the bulletin was first fetched, used for the
+    end-to-end alert latency metric.
+    """
+    if not bulletin_events:
+        logger.info("No recent events in the bulletin")
+        remember_bulletin_state(bulletin_state)
+        return "No recent events"
     
-    for user in all_users:
-        settings = NotificationSettings.query.filter_by(user_id=user.id).first()
-        
-        if not settings:
+    results = [
+        process_bulletin_event(event_key, bulletin_data, stored_event_id, seen_at)
+        for event_key, bulletin_data, stored_event_id in unhandled_bulletin_events(bulletin_events)
+    ]
+    
+    # Rows owned by another worker, or lost to one, stay pending so the next poll retries them
+    if unhandled_bulletin_events(bulletin_events):
+        logger.warning("Some bulletin events are still being handled elsewhere; bulletin state not saved")
+    else:
+        remember_bulletin_state(bulletin_state)
+    
+    if not results:
+        logger.info("All recent events already processed")
+        return "Already processed"
+    
+    return "\n".join(results)
+
+
+def unhandled_bulletin_events(bulletin_events):
+    """(event_key, bulletin_data, stored_event_id) for rows that are new, revise a stored event, or are not yet dispatched
+    
+    Oldest first so alerts go out in the order the quakes happened.
+    """
+    recent_events = {}
+    for bulletin_data in bulletin_events:
+        if LocationAnalyzer.parse_magnitude(bulletin_data['magnitude']) < MIN_ALERT_MAGNITUDE:
             continue
-        
-        if magnitude < settings.magnitude_threshold:
+        recent_events.setdefault(canonical_event_key(bulletin_data), bulletin_data)
+    
+    if not recent_events:
+        return []
+    
+    rows = list(recent_events.values())
+    pending = []
+    
+    for bulletin_data, (event_key, stored_event) in reversed(list(zip(rows, resolve_bulletin_events(rows)))):
+        if stored_event and stored_event.event_key == event_key and (stored_event.has_been_processed or stored_event.dispatched_at):
             continue
         
-        if settings.monitor_location_type == 'near_me':
-            check_province = user.user_province
-            check_city = user.user_city
-        else:
-            check_province = settings.alternate_province
-            check_city = settings.alternate_city
-        
-        user_radius = min(impact_radius, settings.proximity_range_km)
+        pending.append((event_key, bulletin_data, stored_event.id if stored_event else None))
+    
+    return pending
+
+
+def recent_bulletin_events(bulletin_events):
+    """Yield bulletin rows until they fall outside the lookback window"""
+    cutoff = datetime.now(PHILIPPINE_TIMEZONE).replace(tzinfo=None) - timedelta(minutes=BULLETIN_LOOKBACK_MINUTES)
+    
+    for index, bulletin_data in enumerate(bulletin_events):
+        if index >= BULLETIN_MAX_EVENTS:
+            break
         
-        is_affected = LocationAnalyzer.is_location_affected(
-            check_province,
-            check_city,
-            quake_coords,
-            user_radius
-        )
+        event_time = LocationAnalyzer.parse_event_time(bulletin_data['date_time'])
+        if event_time and event_time < cutoff:
+            break
         
-        if is_affected:
-            if send_user_notification(user, settings, bulletin_data, summarizer):
-                sent_count += 1
-    
-    return sent_count
+        yield bulletin_data
 
 
-def send_user_notification(user, settings, bulletin_data, summarizer):
-    """Send earthquake notification email to user"""
+def process_bulletin_event(event_key, bulletin_data, stored_event_id=None, seen_at=None):
+    """Store a single bulletin event and notify affected users
+    
+    stored_event_id names the event this row was matched to when its key is
+    new, i.e. when the row is a revision (see app.events).
+    
+    Runs under a per-event lease lock. Every write after the lock is taken is
+    guarded by its fencing token, so a worker whose lease ran out cannot
+    dispatch an event another worker now owns.
+    """
+    magnitude = LocationAnalyzer.parse_magnitude(bulletin_data['magnitude'])
+    label = event_label(bulletin_data)
+    
+    if magnitude < MIN_ALERT_MAGNITUDE:
+        logger.info(f"Magnitude {magnitude} below minimum threshold")
+        return f"Magnitude {magnitude} too low"
+    
+    # Revisions lock on the stored event's key so they serialize with it. The key
+    # moves with each revision, so fences come from one counter for all events.
+    stored_event = resolve_stored_event(event_key, stored_event_id)
+    lock = FencedLock(f"event:{(stored_event and stored_event.event_key) or event_key}", EVENT_LEASE_SECONDS, fence_name='events')
+    
+    if not lock.acquire():
+        logger.info(f"Event {label} is being processed by another worker")
+        return f"Event {label} owned by another worker"
+    
     try:
-        summary = summarizer.create_summary(bulletin_data, settings.add_safety_tips)
+        return process_owned_event(event_key, bulletin_data, stored_event_id, magnitude, seen_at, lock.fence)
+    finally:
+        lock.release()
+
+
+def process_owned_event(event_key, bulletin_data, stored_event_id, magnitude, seen_at, fence):
+    """Body of process_bulletin_event, run while holding the event's lock"""
+    label = event_label(bulletin_data)
+    
+    # Re-read under the lock: another worker may have stored or finished it since we looked
+    current_event = resolve_stored_event(event_key, stored_event_id)
+    
+    if current_event:
+        if not take_event_fence(current_event.id, fence):
+            return f"Event {label} taken over by a newer worker"
         
-        subject = f"🚨 Earthquake Alert - Magnitude {bulletin_data['magnitude']}"
+        if current_event.event_key != event_key:
+            revision = revise_event(current_event, event_key, bulletin_data, fence)
+            if revision is None:
+                return f"Event {label} taken over by a newer worker"
+            logger.info(f"🔄 Event {revision.event_identifier} revised by bulletin row {label}")
+            
+            if current_event.has_been_processed or current_event.dispatched_at:
+                return notify_revision(current_event, bulletin_data, revision, fence)
         
-        body = f"""🚨 EARTHQUAKE NOTIFICATION 🚨
+        if current_event.has_been_processed or current_event.dispatched_at:
+            return f"Event {label} already handled"
+    
+    logger.info(f"⚠️ Significant event detected: Magnitude {magnitude}")
+    
+    lat, lon = LocationAnalyzer.parse_coordinates(
+        bulletin_data['latitude'],
+        bulletin_data['longitude']
+    )
+    
+    if not current_event:
+        current_event = SeismicEvent(
+            event_key=event_key,
+            event_identifier=label,
+            first_seen_at=datetime.utcfromtimestamp(seen_at) if seen_at else None,
+            has_been_processed=False,
+            processing_fence=fence,
+            bulletin_data=bulletin_data,
+            **bulletin_event_fields(bulletin_data)
+        )
+        database.session.add(current_event)
+        database.session.commit()
+        summarize_event.delay(current_event.id, bulletin_data)
+    
+    recipients_queued = process_notifications(current_event, bulletin_data, (lat, lon), magnitude, fence)
+    
+    if recipients_queued is None:
+        logger.warning(f"Lost ownership of event {label} before dispatch")
+        return f"Event {label} taken over by a newer worker"
+    
+    result = f"✅ Event {label} processed: {recipients_queued} notifications queued"
+    logger.info(result)
+    return result
 
-Dear {user.full_name},
 
-{summary}
+def revise_event(event, event_key, bulletin_data, fence):
+    """Overwrite a stored event with a revised bulletin row while this worker holds its fence
+    
+    The replaced values are kept as a SeismicEventRevision, which is returned;
+    None means a newer worker owns the event.
+    """
+    revision = SeismicEventRevision(
+        event_id=event.id,
+        event_key=event.event_key,
+        event_identifier=event.event_identifier,
+        event_magnitude=event.event_magnitude,
+        event_location=event.event_location,
+        latitude_coord=event.latitude_coord,
+        longitude_coord=event.longitude_coord,
+        depth_km=event.depth_km,
+        occurred_at=event.occurred_at
+    )
+    
+    revised = SeismicEvent.query.filter(
+        SeismicEvent.id == event.id,
+        SeismicEvent.processing_fence == fence
+    ).update({
+        'event_key': event_key,
+        'event_identifier': event_label(bulletin_data),
+        'bulletin_data': bulletin_data,
+        **bulletin_event_fields(bulletin_data)
+    }, synchronize_session=False)
+    
+    if revised != 1:
+        database.session.rollback()
+        return None
+    
+    database.session.add(revision)
+    database.session.commit()
+    database.session.refresh(event)
+    return revision
 
----
-EARTHQUAKE DETAILS:
-• Time: {bulletin_data['date_time']}
-• Location: {bulletin_data['location']}
-• Magnitude: {bulletin_data['magnitude']}
-• Depth: {bulletin_data['depth']}
-• Coordinates: {bulletin_data['latitude']}, {bulletin_data['longitude']}
 
-Your monitored location: {user.user_city}, {user.user_province}
-Full bulletin: {bulletin_data.get('detail_link', 'N/A')}
+def notify_revision(event, bulletin_data, revision, fence):
+    """Alert only the subscribers a revision of an already dispatched event newly reaches
+    
+    Recipients already in the delivery ledger for the event are excluded in
+    the matching query, so nobody is emailed twice. A revision that neither
+    raises the magnitude nor moves the epicentre cannot reach anyone new and
+    is not matched at all.
+    """
+    label = event.event_identifier
+    moved = (revision.latitude_coord, revision.longitude_coord) != (event.latitude_coord, event.longitude_coord)
+    
+    if event.event_magnitude <= revision.event_magnitude and not moved:
+        logger.info(f"Revision of {label} does not widen its impact")
+        return f"Event {label} revised: no new recipients"
+    
+    recipient_ids = match_recipients(
+        event, (event.latitude_coord, event.longitude_coord), event.event_magnitude, exclude_notified=True
+    )
+    
+    if not recipient_ids:
+        return f"Event {label} revised: no new recipients"
+    
+    # Ownership check before anything is queued; the ledger dedupes any later overlap
+    if not SeismicEvent.query.filter_by(id=event.id, processing_fence=fence).count():
+        return f"Event {label} taken over by a newer worker"
+    
+    record_pending_deliveries(event.id, recipient_ids)
+    revision.newly_notified = len(recipient_ids)
+    database.session.commit()
+    
+    summarize_event.delay(event.id, bulletin_data)
+    chunks = queue_delivery_chunks(event.id, bulletin_data, recipient_ids)
+    
+    result = f"✅ Event {label} revised: {len(recipient_ids)} newly affected recipients queued in {chunks} chunks"
+    logger.info(result)
+    return result
 
----
-SOURCE: This earthquake information is sourced from PHIVOLCS (Philippine Institute of 
-Volcanology and Seismology) official earthquake bulletins.
 
-DISCLAIMER: This summary was generated by artificial intelligence. While we strive for 
-accuracy, please refer to the official PHIVOLCS bulletin for authoritative information.
+def take_event_fence(event_id, fence):
+    """Record this worker's fencing token on the event unless a newer one is there"""
+    taken = SeismicEvent.query.filter(
+        SeismicEvent.id == event_id,
+        or_(SeismicEvent.processing_fence.is_(None), SeismicEvent.processing_fence < fence)
+    ).update({SeismicEvent.processing_fence: fence}, synchronize_session=False)
+    database.session.commit()
+    return taken == 1
 
----
-This is an automated notification from the Earthquake Monitoring System.
-You can update your preferences in your dashboard.
 
-Stay safe!"""
+def fenced_event_update(event_id, fence, values):
+    """Update an undispatched event only while this worker's fence is still current
+    
+    Not committed, so the caller can finish related work in the same transaction.
+    """
+    return SeismicEvent.query.filter(
+        SeismicEvent.id == event_id,
+        SeismicEvent.processing_fence == fence,
+        SeismicEvent.dispatched_at.is_(None),
+        SeismicEvent.has_been_processed == False
+    ).update(values, synchronize_session=False) == 1
 
-        email_msg = Message(
-            subject=subject,
-            recipients=[user.email_address],
-            body=body
-        )
-        email_service.send(email_msg)
+
+@task_queue.task(name='app.tasks.summarize_event')
+def summarize_event(event_id, bulletin_data):
+    """Pipeline stage run as soon as an event is stored: warm every summary variant
+    
+    Delivery chunks then read summaries from the cache, or wait on the
+    in-flight generation instead of calling Gemini themselves.
+    """
+    variants = get_summarizer().precompute_summaries(bulletin_data, event_id=event_id)
+    
+    logger.info(f"✅ Summaries ready for event {event_id}: {', '.join(variants)}")
+    return list(variants)
+
+
+def process_notifications(event, bulletin_data, quake_coords, magnitude, fence):
+    """Match affected users and fan their notifications out as parallel delivery subtasks
+    
+    Returns the number of recipients queued, or None if a newer worker took the
+    event over first. A chord callback marks the event processed once every
+    delivery chunk has finished.
+    """
+    recipient_ids = match_recipients(event, quake_coords, magnitude)
+    
+    if not recipient_ids:
+        if not fenced_event_update(event.id, fence, {SeismicEvent.has_been_processed: True}):
+            database.session.rollback()
+            return None
+        database.session.commit()
+        return 0
+    
+    # Ledger rows are only written while this worker still owns the event
+    if not fenced_event_update(event.id, fence, {SeismicEvent.dispatched_at: datetime.utcnow()}):
+        database.session.rollback()
+        return None
+    
+    record_pending_deliveries(event.id, recipient_ids)
+    database.session.commit()
+    
+    chunks = queue_delivery_chunks(event.id, bulletin_data, recipient_ids)
+    
+    logger.info(f"📨 Queued {len(recipient_ids)} notifications in {chunks} chunks")
+    return len(recipient_ids)
+
+
+def queue_delivery_chunks(event_id, bulletin_data, recipient_ids):
+    """Fan recipients out as delivery subtasks with a chord that marks the event processed"""
+    chunk_size = current_app.config['MAIL_BATCH_SIZE']
+    deliveries = group([
+        deliver_notification_batch.s(event_id, bulletin_data, recipient_ids[start:start + chunk_size])
+        for start in range(0, len(recipient_ids), chunk_size)
+    ])
+    chord(deliveries)(finalize_event_notifications.s(event_id))
+    return len(deliveries.tasks)
+
+
+def match_recipients(event, quake_coords, magnitude, exclude_notified=False):
+    """Ids of active users whose monitored location is within range of the event
+    
+    exclude_notified skips users already in the event's delivery ledger.
+    """
+    impact_radius = LocationAnalyzer.calculate_affected_radius(magnitude)
+    distance_table = LocationAnalyzer.get_event_distance_table(event.id, quake_coords, impact_radius)
+    
+    if not distance_table:
+        logger.info("No monitored locations within the impact radius")
+        return []
+    
+    check_subscription_index()
+    candidate_cities = {city for _, city in distance_table}
+    exclude_event_id = event.id if exclude_notified else None
+    recipient_ids = []
+    
+    for user_id, province, city, range_km in iter_indexed_subscribers(magnitude, candidate_cities, exclude_event_id):
+        distance = distance_table.get((province, city))
+        user_radius = min(impact_radius, range_km)
         
-        logger.info(f"✅ Notification sent to {user.email_address}")
-        return True
-    except Exception as error:
-        logger.error(f"❌ Failed to send email to {user.email_address}: {error}")
-        return False
\ No newline at end of file
+        if distance is not None and distance <= user_radius:
+            recipient_ids.append(user_id)
+    
+    return recipient_ids
+
+
+@task_queue.task(bind=True, max_retries=MAX_DELIVERY_ATTEMPTS - 1, acks_late=True, reject_on_worker_lost=True,
+                 name='app.tasks.deliver_notification_batch')
+def deliver_notification_batch(self, event_id, bulletin_data, user_ids, sent_so_far=0):
+    """Send one chunk of notifications, retrying only the recipients that failed
+    
+    Recipients are claimed through the delivery ledger first, so anyone already
+    emailed by an earlier attempt or another worker is skipped. That makes it
+    safe to acknowledge late: a chunk whose worker died is delivered again.
+    """
+    claim_token, claimed_ids = claim_deliveries(event_id, user_ids)
+    sent_ids = []
+    
+    if claimed_ids:
+        rows = database.session.query(User, NotificationSettings).join(
+            NotificationSettings, NotificationSettings.user_id == User.id
+        ).filter(User.id.in_(claimed_ids)).all()
+        
+        renderer = NotificationRenderer(bulletin_data, get_summarizer(), event_id)
+        messages = [renderer.build(user, settings) for user, settings in rows]
+        deliver = send_bulk_async if current_app.config['MAIL_ASYNC_DELIVERY'] else send_bulk
+        results = deliver(messages)
+        sent_ids = [user.id for (user, _), sent in zip(rows, results) if sent]
+    
+    failed_ids = list(set(claimed_ids) - set(sent_ids))
+    complete_deliveries(event_id, claim_token, sent_ids, failed_ids)
+    
+    if sent_ids:
+        record_first_alert(event_id)
+    sent_count = sent_so_far + len(sent_ids)
+    
+    if failed_ids and self.request.retries < self.max_retries:
+        logger.warning(f"Retrying {len(failed_ids)} failed notifications for event {event_id}")
+        raise self.retry(args=(event_id, bulletin_data, failed_ids, sent_count), countdown=30 * (self.request.retries + 1))
+    
+    if failed_ids:
+        logger.error(f"❌ Giving up on {len(failed_ids)} notifications for event {event_id}")
+    
+    return sent_count
+
+
+@task_queue.task(name='app.tasks.sweep_stalled_deliveries')
+def sweep_stalled_deliveries():
+    """Periodic task: re-queue deliveries whose task was lost and finish events whose chord never fired"""
+    requeued = 0
+    
+    for event_id, user_ids in stalled_deliveries().items():
+        event = SeismicEvent.query.get(event_id)
+        if not event.bulletin_data:
+            logger.warning(f"Event {event.event_identifier} has stalled deliveries but no stored bulletin row")
+            continue
+        
+        queue_delivery_chunks(event_id, event.bulletin_data, user_ids)
+        requeued += len(user_ids)
+    
+    finished = unfinished_events()
+    for event in finished:
+        finalize_event_notifications.delay([], event.id)
+    
+    if requeued or finished:
+        logger.warning(f"🧹 Re-queued {requeued} stalled notifications, finalized {len(finished)} events")
+    return requeued
+
+
+@task_queue.task(name='app.tasks.finalize_event_notifications')
+def finalize_event_notifications(sent_counts, event_id):
+    """Chord callback: total the delivery chunks and mark the event processed"""
+    event = SeismicEvent.query.get(event_id)
+    event.has_been_processed = True
+    database.session.commit()
+    
+    total_sent = sum(sent_counts)
+    logger.info(f"✅ Event {event.event_identifier} delivered: {total_sent} notifications sent")
+    return total_sent
\ No newline at end of file
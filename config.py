@@ -24,9 +24,18 @@ class BaseConfiguration:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 100))  # Messages per SMTP connection
+    MAIL_ASYNC_DELIVERY = os.getenv('MAIL_ASYNC_DELIVERY', 'false').lower() == 'true'
+    MAIL_ASYNC_CONCURRENCY = int(os.getenv('MAIL_ASYNC_CONCURRENCY', 5))  # Concurrent SMTP sessions
+    MAIL_RATE_LIMIT_PER_SECOND = float(os.getenv('MAIL_RATE_LIMIT_PER_SECOND', 0))  # 0 disables throttling
     
     # AI Configuration
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    AI_SUMMARY_MIN_MAGNITUDE = float(os.getenv('AI_SUMMARY_MIN_MAGNITUDE', 4.0))  # Smaller events get a template summary
+    
+    # Bulletin poller (poller.py)
+    POLL_FAST_SECONDS = int(os.getenv('POLL_FAST_SECONDS', 15))  # After recent activity
+    POLL_SLOW_SECONDS = int(os.getenv('POLL_SLOW_SECONDS', 120))  # Ceiling when quiet
     
     # Task Queue
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -0,0 +1,31 @@
+"""
+Migration script to create the subscription_index table
+and backfill it from existing users' notification settings
+"""
+from app import build_application, database
+from app.models import SubscriptionIndex
+from app.subscriptions import rebuild_subscription_index
+
+def migrate():
+    app = build_application()
+    
+    with app.app_context():
+        # Check if subscription_index table exists
+        from sqlalchemy import inspect
+        inspector = inspect(database.engine)
+        
+        if 'subscription_index' not in inspector.get_table_names():
+            print("Creating subscription_index table...")
+            SubscriptionIndex.__table__.create(database.engine)
+            print("✅ Table created successfully!")
+        else:
+            print("✅ subscription_index table already exists")
+        
+        # Index every user from their current settings
+        indexed = rebuild_subscription_index()
+        
+        print(f"\n✅ Migration complete!")
+        print(f"   {indexed} users indexed")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,28 @@
+"""
+Low-latency bulletin poller entry point with Flask app context
+Run with: python poller.py
+
+Polls PHIVOLCS every POLL_FAST_SECONDS after recent activity, backing off to
+POLL_SLOW_SECONDS when quiet, and hands new events to the Celery workers.
+"""
+from app import build_application
+import logging
+import os
+import signal
+
+# Create Flask app
+flask_app = build_application(os.getenv('FLASK_ENV', 'development'))
+flask_app.app_context().push()
+
+from app.poller import BulletinPoller
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    poller = BulletinPoller(
+        fast_interval=flask_app.config['POLL_FAST_SECONDS'],
+        slow_interval=flask_app.config['POLL_SLOW_SECONDS']
+    )
+    signal.signal(signal.SIGTERM, lambda *_: poller.stop())
+    signal.signal(signal.SIGINT, lambda *_: poller.stop())
+    poller.run()
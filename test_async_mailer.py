@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Throughput check for the async SMTP delivery engine
+Sends the same envelopes through one sequential session and through AsyncMailer
+against a local SMTP server that answers each message with a fixed delay
+"""
+import sys
+import os
+import time
+import asyncio
+import smtplib
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGE_COUNT = 60
+SERVER_DELAY = 0.02
+PORT = 8039
+
+
+class DelayedHandler:
+    """Accept every message after a delay, like a remote provider would"""
+    
+    def __init__(self):
+        self.received = 0
+    
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(SERVER_DELAY)
+        self.received += 1
+        return '250 OK'
+
+
+def build_envelopes(count):
+    envelopes = []
+    for index in range(count):
+        body = (
+            f"From: alerts@example.com\r\nTo: user{index}@example.com\r\n"
+            f"Subject: Earthquake Alert {index}\r\n\r\nTest body\r\n"
+        ).encode()
+        envelopes.append(('alerts@example.com', [f'user{index}@example.com'], body))
+    return envelopes
+
+
+def test_async_mailer_throughput():
+    """AsyncMailer delivers everything and beats one sequential session"""
+    print("\n📧 Testing async SMTP delivery...")
+    
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("⚠️  aiosmtpd not installed, skipping")
+        return True
+    
+    try:
+        from app.async_mailer import AsyncMailer
+        
+        handler = DelayedHandler()
+        controller = Controller(handler, hostname='127.0.0.1', port=PORT)
+        controller.start()
+        envelopes = build_envelopes(MESSAGE_COUNT)
+        
+        try:
+            started = time.perf_counter()
+            with smtplib.SMTP('127.0.0.1', PORT) as smtp:
+                for sender, recipients, body in envelopes:
+                    smtp.sendmail(sender, recipients, body)
+            sequential = time.perf_counter() - started
+            
+            mailer = AsyncMailer('127.0.0.1', PORT, concurrency=10)
+            started = time.perf_counter()
+            results = mailer.send_all(envelopes)
+            concurrent = time.perf_counter() - started
+        finally:
+            controller.stop()
+        
+        print(f"   Sequential session: {MESSAGE_COUNT / sequential:7.1f} msg/s")
+        print(f"   AsyncMailer (10):   {MESSAGE_COUNT / concurrent:7.1f} msg/s")
+        
+        if not all(results) or handler.received != MESSAGE_COUNT * 2:
+            print(f"❌ Expected {MESSAGE_COUNT} deliveries per run, server saw {handler.received}")
+            return False
+        
+        if concurrent >= sequential:
+            print("❌ Concurrent delivery was not faster than a single session")
+            return False
+        
+        print("✅ Async delivery test passed")
+        return True
+    except Exception as e:
+        print(f"❌ Async delivery test failed: {e}")
+        return False
+
+
+def test_rate_limit():
+    """The rate limit spaces sends out even with spare concurrency"""
+    print("\n⏱️  Testing send rate limit...")
+    
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("⚠️  aiosmtpd not installed, skipping")
+        return True
+    
+    try:
+        from app.async_mailer import AsyncMailer
+        
+        handler = DelayedHandler()
+        controller = Controller(handler, hostname='127.0.0.1', port=PORT + 1)
+        controller.start()
+        
+        try:
+            mailer = AsyncMailer('127.0.0.1', PORT + 1, concurrency=10, rate_limit=50)
+            started = time.perf_counter()
+            results = mailer.send_all(build_envelopes(20))
+            elapsed = time.perf_counter() - started
+        finally:
+            controller.stop()
+        
+        # 20 sends at 50/s need at least 19 intervals of 20 ms
+        if not all(results) or elapsed < 19 / 50:
+            print(f"❌ 20 sends took {elapsed:.2f}s, rate limit not applied")
+            return False
+        
+        print(f"✅ Rate limit test passed ({elapsed:.2f}s for 20 sends at 50/s)")
+        return True
+    except Exception as e:
+        print(f"❌ Rate limit test failed: {e}")
+        return False
+
+
+def main():
+    results = [test_async_mailer_throughput(), test_rate_limit()]
+    
+    if all(results):
+        print("\n🎉 All async mailer tests passed!")
+        return 0
+    
+    print("\n⚠️  Some async mailer tests failed")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+"""
+Test script for the event ingestion pipeline
+Covers event keys, revision matching, fencing, the delivery ledger and
+incremental re-notification on an in-memory SQLite database with a stub Redis
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TAAL = {
+    'magnitude': '4.2',
+    'date_time': '01 January 2026 - 10:00 AM',
+    'location': '004 km N 45° W of Taal (Batangas)',
+    'depth': '10',
+    'latitude': '14.00',
+    'longitude': '121.00',
+    'detail_link': None
+}
+
+_application = None
+
+
+class StubRedis:
+    """Just enough of the Redis API for locks, fences, caches and metrics"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.expiry = {}
+
+    def _expire_stale(self, key):
+        if key in self.expiry and self.expiry[key] < time.time():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def get(self, key):
+        self._expire_stale(key)
+        value = self.values.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        self._expire_stale(key)
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        if px:
+            self.expiry[key] = time.time() + px / 1000
+        if ex:
+            self.expiry[key] = time.time() + ex
+        return True
+
+    def setex(self, key, seconds, value):
+        self.set(key, value, ex=seconds)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def incr(self, key):
+        self._expire_stale(key)
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        self.expiry[key] = time.time() + seconds
+
+    def eval(self, script, key_count, key, token, *args):
+        # Only the lock release script is used here
+        if self.get(key) == token.encode():
+            self.delete(key)
+            return 1
+        return 0
+
+    def hincrby(self, key, field, amount):
+        counters = self.hashes.setdefault(key, {})
+        counters[field] = counters.get(field, 0) + amount
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+
+class StubSummarizer:
+    """Fixed summary so no test reaches Gemini"""
+
+    def create_summary(self, earthquake_data, include_safety_tips=True, event_id=None):
+        return "Test summary."
+
+    def summary_variant(self, earthquake_data, include_safety_tips):
+        return 'tips' if include_safety_tips else 'plain'
+
+    def uses_local_summary(self, earthquake_data):
+        return True
+
+    def precompute_summaries(self, earthquake_data, event_id=None):
+        return {}
+
+
+def pipeline_app():
+    """Flask app on in-memory SQLite with eager Celery tasks; built once"""
+    global _application
+
+    if _application is None:
+        from config import configuration_map, DevConfiguration
+
+        configuration_map['pipeline_test'] = type('PipelineTestConfiguration', (DevConfiguration,), {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'MAIL_SUPPRESS_SEND': True,
+            'MAIL_DEFAULT_SENDER': 'alerts@example.com',
+            'MAIL_BATCH_SIZE': 10
+        })
+
+        from app import build_application, task_queue
+        import app.tasks as tasks
+
+        _application = build_application('pipeline_test')
+        task_queue.conf.task_always_eager = True
+        tasks.get_summarizer = lambda: StubSummarizer()
+
+    return _application
+
+
+def reset_state():
+    """Fresh tables and an empty stub Redis for one test"""
+    import app
+    from app import database
+
+    app.redis_client = StubRedis()
+    database.session.remove()
+    database.drop_all()
+    database.create_all()
+
+
+def seed_subscribers():
+    """One subscriber per city within 100 km of TAAL, alternating thresholds of 3.0 and 5.0"""
+    from app import database
+    from app.models import User, NotificationSettings
+    from app.location_service import LocationAnalyzer
+    from app.ph_locations import PHILIPPINE_LOCATIONS
+
+    epicenter = (float(TAAL['latitude']), float(TAAL['longitude']))
+    nearby = [
+        (province, city)
+        for province, cities in PHILIPPINE_LOCATIONS.items()
+        for city, coords in cities.items()
+        if LocationAnalyzer.calculate_distance(coords, epicenter) <= 100
+    ]
+
+    for index, (province, city) in enumerate(nearby):
+        user = User(
+            full_name=f'Subscriber {index}',
+            email_address=f'subscriber{index}@example.com',
+            user_province=province,
+            user_city=city
+        )
+        user.set_password('password')
+        database.session.add(user)
+        database.session.flush()
+        database.session.add(NotificationSettings(user_id=user.id, magnitude_threshold=3.0 if index % 2 else 5.0))
+
+    database.session.commit()
+    return len(nearby)
+
+
+def ledger_user_ids(event_id):
+    from app import database
+    from app.models import NotificationDelivery
+
+    rows = database.session.query(NotificationDelivery.user_id).filter_by(event_id=event_id).all()
+    return {user_id for (user_id,) in rows}
+
+
+def test_canonical_event_key():
+    """Keys ignore location wording, change with magnitude, and survive unparseable coordinates"""
+    print("\n🧪 Testing canonical event keys...")
+    try:
+        from app.events import canonical_event_key
+
+        key = canonical_event_key(TAAL)
+        reworded = dict(TAAL, location='005 km N 40° W of Taal', date_time=' 01 January 2026 -  10:00 AM ')
+
+        if len(key) != 32 or canonical_event_key(reworded) != key:
+            print("❌ Same origin, position and magnitude produced a different key")
+            return False
+
+        if canonical_event_key(dict(TAAL, magnitude='4.3')) == key:
+            print("❌ A different magnitude produced the same key")
+            return False
+
+        unplaced = dict(TAAL, latitude='-', longitude='-')
+        if canonical_event_key(unplaced) == canonical_event_key(dict(unplaced, location='Elsewhere')):
+            print("❌ Rows without coordinates collapsed onto one key")
+            return False
+
+        print("✅ Event keys are stable and collision-free for these rows")
+        return True
+    except Exception as e:
+        print(f"❌ Event key test failed: {e}")
+        return False
+
+
+def test_revision_matching_is_one_to_one():
+    """A revision claims its stored event; an aftershock next to it stays a new event"""
+    print("\n🧪 Testing revision matching...")
+    try:
+        with pipeline_app().app_context():
+            reset_state()
+            from app import database
+            from app.models import SeismicEvent
+            from app.events import bulletin_event_fields, canonical_event_key, event_label, resolve_bulletin_events
+
+            stored = SeismicEvent(event_key=canonical_event_key(TAAL), event_identifier=event_label(TAAL), **bulletin_event_fields(TAAL))
+            database.session.add(stored)
+            database.session.commit()
+
+            revised = dict(TAAL, magnitude='4.5', location='Taal revised', latitude='14.02')
+            aftershock = dict(TAAL, magnitude='4.0', location='Aftershock', date_time='01 January 2026 - 10:02 AM', latitude='14.06')
+
+            # Newest first, as on the bulletin page
+            matches = [event for _, event in resolve_bulletin_events([aftershock, revised])]
+            if matches != [None, stored]:
+                print(f"❌ Expected only the revision to match, got {matches}")
+                return False
+
+            # While the original row is still listed, the aftershock must not take it over
+            matches = [event for _, event in resolve_bulletin_events([aftershock, TAAL])]
+            if matches != [None, stored]:
+                print(f"❌ Aftershock listed next to the original matched it: {matches}")
+                return False
+
+        print("✅ Revisions and aftershocks are told apart")
+        return True
+    except Exception as e:
+        print(f"❌ Revision matching test failed: {e}")
+        return False
+
+
+def test_fence_rejects_stale_holder():
+    """After a takeover, writes under the old fencing token are refused"""
+    print("\n🧪 Testing fenced event ownership...")
+    try:
+        with pipeline_app().app_context():
+            reset_state()
+            import app
+            from app import database
+            from app.models import SeismicEvent
+            from app.locks import FencedLock
+            from app.events import bulletin_event_fields, event_label
+            from app.tasks import take_event_fence, fenced_event_update
+
+            event = SeismicEvent(event_key='f' * 32, event_identifier=event_label(TAAL), **bulletin_event_fields(TAAL))
+            database.session.add(event)
+            database.session.commit()
+
+            stale = FencedLock('event:test', 120, fence_name='events')
+            stale.acquire()
+            take_event_fence(event.id, stale.fence)
+
+            # The lease runs out and a second worker takes over
+            app.redis_client.delete(stale.key)
+            current = FencedLock('event:test', 120, fence_name='events')
+            if not current.acquire() or current.fence <= stale.fence:
+                print("❌ Takeover did not issue a newer fence")
+                return False
+            take_event_fence(event.id, current.fence)
+
+            if take_event_fence(event.id, stale.fence):
+                print("❌ Stale holder took the fence back")
+                return False
+
+            if fenced_event_update(event.id, stale.fence, {SeismicEvent.dispatched_at: datetime.utcnow()}):
+                print("❌ Stale holder dispatched the event")
+                return False
+            database.session.rollback()
+
+            if not fenced_event_update(event.id, current.fence, {SeismicEvent.dispatched_at: datetime.utcnow()}):
+                print("❌ Current holder could not dispatch the event")
+                return False
+            database.session.commit()
+
+        print("✅ Only the newest fence can write")
+        return True
+    except Exception as e:
+        print(f"❌ Fence test failed: {e}")
+        return False
+
+
+def test_claim_tokens_guard_outcomes():
+    """A worker whose claim went stale cannot overwrite the new claimant's outcome"""
+    print("\n🧪 Testing delivery claims...")
+    try:
+        with pipeline_app().app_context():
+            reset_state()
+            seed_subscribers()
+            from app import database
+            from app.models import SeismicEvent, NotificationDelivery
+            from app.events import bulletin_event_fields, event_label
+            from app.delivery import record_pending_deliveries, claim_deliveries, complete_deliveries
+
+            event = SeismicEvent(event_key='c' * 32, event_identifier=event_label(TAAL), **bulletin_event_fields(TAAL))
+            database.session.add(event)
+            database.session.commit()
+
+            record_pending_deliveries(event.id, [1, 2])
+            record_pending_deliveries(event.id, [2, 3])
+            database.session.commit()
+            if ledger_user_ids(event.id) != {1, 2, 3}:
+                print("❌ Pending deliveries were duplicated or lost")
+                return False
+
+            stale_token, _ = claim_deliveries(event.id, [1, 2])
+            _, nothing = claim_deliveries(event.id, [1, 2])
+            if nothing:
+                print("❌ Rows being sent were claimed twice")
+                return False
+
+            # The first claim outlives its lease and another worker re-claims the rows
+            NotificationDelivery.query.update({NotificationDelivery.claimed_at: datetime.utcnow() - timedelta(hours=1)})
+            database.session.commit()
+            token, reclaimed = claim_deliveries(event.id, [1, 2])
+            if sorted(reclaimed) != [1, 2]:
+                print(f"❌ Stale claims were not re-claimed: {reclaimed}")
+                return False
+
+            complete_deliveries(event.id, stale_token, [], [1, 2])
+            complete_deliveries(event.id, token, [1, 2], [])
+            statuses = {
+                delivery.user_id: delivery.status
+                for delivery in NotificationDelivery.query.filter_by(event_id=event.id)
+            }
+            if statuses != {1: 'sent', 2: 'sent', 3: 'pending'}:
+                print(f"❌ Unexpected ledger state {statuses}")
+                return False
+
+        print("✅ Claims and outcomes are tied to their token")
+        return True
+    except Exception as e:
+        print(f"❌ Delivery claim test failed: {e}")
+        return False
+
+
+def test_revision_notifies_only_new_subscribers():
+    """A stronger revision reaches new subscribers once; a weaker one reaches nobody"""
+    print("\n🧪 Testing incremental re-notification...")
+    try:
+        with pipeline_app().app_context():
+            reset_state()
+            seed_subscribers()
+            from app.models import SeismicEvent, SeismicEventRevision, NotificationDelivery
+            from app.tasks import ingest_bulletin_events, match_recipients
+
+            ingest_bulletin_events([TAAL], {'content_hash': 'first'})
+            event = SeismicEvent.query.one()
+            first = ledger_user_ids(event.id)
+
+            stronger = dict(TAAL, magnitude='5.1', location='Taal revised', latitude='14.01')
+            ingest_bulletin_events([stronger], {'content_hash': 'second'})
+
+            if SeismicEvent.query.count() != 1:
+                print("❌ The revision was stored as a new event")
+                return False
+
+            after = ledger_user_ids(event.id)
+            revision = SeismicEventRevision.query.one()
+            expected = set(match_recipients(event, (event.latitude_coord, event.longitude_coord), event.event_magnitude))
+
+            if not first or after != expected or revision.newly_notified != len(after - first):
+                print(f"❌ Ledger {len(first)} -> {len(after)}, full match {len(expected)}, revision {revision.newly_notified}")
+                return False
+
+            if NotificationDelivery.query.filter(NotificationDelivery.status != 'sent').count():
+                print("❌ Some deliveries were not sent")
+                return False
+
+            weaker = dict(stronger, magnitude='4.8', location='Taal revised again')
+            ingest_bulletin_events([weaker], {'content_hash': 'third'})
+            if ledger_user_ids(event.id) != after or SeismicEventRevision.query.count() != 2:
+                print("❌ A weaker revision changed the recipients")
+                return False
+
+            print(f"   {len(first)} alerted first, {len(after - first)} more after the revision")
+
+        print("✅ Revisions alert only newly affected subscribers")
+        return True
+    except Exception as e:
+        print(f"❌ Re-notification test failed: {e}")
+        return False
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🌋 EVENT PIPELINE CHECK")
+    print("=" * 60)
+
+    tests = [
+        test_canonical_event_key,
+        test_revision_matching_is_one_to_one,
+        test_fence_rejects_stale_holder,
+        test_claim_tokens_guard_outcomes,
+        test_revision_notifies_only_new_subscribers,
+    ]
+
+    results = [test() for test in tests]
+    passed = sum(results)
+    total = len(results)
+
+    print("\n" + "=" * 60)
+    if passed == total:
+        print(f"✅ ALL TESTS PASSED ({passed}/{total})")
+    else:
+        print(f"⚠️  SOME TESTS FAILED ({passed}/{total} passed)")
+    print("=" * 60)
+    return 0 if passed == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Test script for subscriber location matching
+Compares the spatial index against a brute-force scan of every monitored city
+"""
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_EPICENTERS = [
+    (14.5995, 120.9842),   # Manila
+    (10.3157, 123.8854),   # Cebu City
+    (7.1907, 125.4553),    # Davao City
+    (12.0000, 122.0000),   # Sibuyan Sea
+    (19.5000, 127.5000),   # Offshore, far from everything
+]
+
+
+def test_spatial_index_matches_brute_force():
+    """Every city within the radius must be returned by the index"""
+    print("\n🧪 Testing spatial index against brute force...")
+    try:
+        from app.location_service import LocationAnalyzer, get_location_index
+        from app.ph_locations import PHILIPPINE_LOCATIONS
+
+        for quake_coords in SAMPLE_EPICENTERS:
+            for magnitude in (3.0, 4.5, 6.0, 7.5):
+                radius = LocationAnalyzer.calculate_affected_radius(magnitude)
+                candidates = {
+                    (province, city)
+                    for province, city, _ in get_location_index().candidates_within(quake_coords, radius)
+                }
+
+                expected = {
+                    (province, city)
+                    for province, cities in PHILIPPINE_LOCATIONS.items()
+                    for city, coords in cities.items()
+                    if LocationAnalyzer.calculate_distance(coords, quake_coords) <= radius
+                }
+
+                missing = expected - candidates
+                if missing:
+                    print(f"❌ Index missed {missing} for {quake_coords} M{magnitude}")
+                    return False
+
+        print("✅ Spatial index returns every affected city")
+        return True
+    except Exception as e:
+        print(f"❌ Spatial index test failed: {e}")
+        return False
+
+
+def test_vectorized_distances_match_geodesic():
+    """Boundary decisions from the batch haversine pass must agree with geodesic"""
+    print("\n🧪 Testing vectorized distances against geodesic...")
+    try:
+        import random
+        from app.location_service import LocationAnalyzer
+
+        random.seed(42)
+        points = [(random.uniform(4.5, 21.0), random.uniform(116.0, 127.0)) for _ in range(500)]
+
+        for quake_coords in SAMPLE_EPICENTERS:
+            exact = [LocationAnalyzer.calculate_distance(point, quake_coords) for point in points]
+
+            # Pick radii that sit right on top of real distances to stress the refinement
+            for radius in [exact[0], exact[1] + 0.01, exact[2] - 0.01, 150.0]:
+                distances = LocationAnalyzer.distances_from(quake_coords, points, radius)
+                for point_distance, exact_distance in zip(distances, exact):
+                    if (point_distance <= radius) != (exact_distance <= radius):
+                        print(f"❌ Decision mismatch at radius {radius:.3f} km for {quake_coords}")
+                        return False
+
+            unrefined = LocationAnalyzer.distances_from(quake_coords, points)
+            worst = max(abs(a - b) / b for a, b in zip(unrefined, exact) if b > 1)
+            print(f"   {quake_coords}: worst haversine error {worst:.4%}")
+
+        print("✅ Vectorized distances agree with geodesic at the boundary")
+        return True
+    except Exception as e:
+        print(f"❌ Vectorized distance test failed: {e}")
+        return False
+
+
+def test_distance_table_matches_per_city_checks():
+    """The per-event table must hold exactly the cities is_location_affected accepts"""
+    print("\n🧪 Testing per-event distance table...")
+    try:
+        from app.location_service import LocationAnalyzer
+        from app.ph_locations import PHILIPPINE_LOCATIONS
+
+        for event_key, quake_coords in enumerate(SAMPLE_EPICENTERS):
+            radius = LocationAnalyzer.calculate_affected_radius(5.5)
+            table = LocationAnalyzer.get_event_distance_table(event_key, quake_coords, radius)
+
+            expected = {
+                (province, city)
+                for province, cities in PHILIPPINE_LOCATIONS.items()
+                for city in cities
+                if LocationAnalyzer.is_location_affected(province, city, quake_coords, radius)
+            }
+
+            if set(table) != expected:
+                print(f"❌ Table mismatch for {quake_coords}: {set(table) ^ expected}")
+                return False
+
+            if LocationAnalyzer.get_event_distance_table(event_key, quake_coords, radius) is not table:
+                print("❌ Distance table was recomputed for the same event")
+                return False
+
+        print("✅ Distance table matches per-city checks")
+        return True
+    except Exception as e:
+        print(f"❌ Distance table test failed: {e}")
+        return False
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("📍 LOCATION MATCHING CHECK")
+    print("=" * 60)
+
+    tests = [
+        test_spatial_index_matches_brute_force,
+        test_vectorized_distances_match_geodesic,
+        test_distance_table_matches_per_city_checks,
+    ]
+
+    results = [test() for test in tests]
+    passed = sum(results)
+    total = len(results)
+
+    print("\n" + "=" * 60)
+    if passed == total:
+        print(f"✅ ALL TESTS PASSED ({passed}/{total})")
+    else:
+        print(f"⚠️  SOME TESTS FAILED ({passed}/{total} passed)")
+    print("=" * 60)
+    return 0 if passed == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Benchmark for the PHIVOLCS bulletin parser
+Compares the lxml parser against the previous BeautifulSoup html.parser scan
+
+Run with saved pages: python test_scraper_performance.py page1.html page2.html
+Without arguments a synthetic bulletin page is generated.
+"""
+import sys
+import os
+import time
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROUNDS = 5
+
+
+def build_fixture_page(row_count=800):
+    """Build a Word-exported style page shaped like the PHIVOLCS homepage"""
+    rows = []
+    for index in range(row_count):
+        minute = index % 60
+        rows.append(
+            "<tr style='mso-yfti-irow:1'>"
+            f"<td class=auto-style91><span class=auto-style99><a href=\"2025_Earthquake_Information\\November\\"
+            f"2025_1104_{index:04d}_B1.html\"><span style='font-size:9.0pt'>04 November 2025 - 09:{minute:02d} AM"
+            "</span></a></span></td>"
+            f"<td class=auto-style52><p class=MsoNormal align=center>{10 + index % 9}.{index % 100:02d}</p></td>"
+            f"<td class=auto-style52><p class=MsoNormal align=center>{121 + index % 5}.{index % 100:02d}</p></td>"
+            f"<td class=auto-style52><p class=MsoNormal align=center>{(index % 40) + 1:03d}</p></td>"
+            f"<td class=auto-style52><p class=MsoNormal align=center>{1 + index % 5}.{index % 10}</p></td>"
+            f"<td class=auto-style53><p class=MsoNormal>{index % 30:03d} km N {(index * 7) % 90:02d}° E of "
+            "Sample Municipality (Province)</p></td>"
+            "</tr>"
+        )
+
+    filler = "<p class=MsoNormal><span style='font-size:10.0pt'>&nbsp;</span></p>" * 2000
+    header_table = (
+        "<table class=MsoNormalTable border=0><tr><td>Latest Earthquake Information</td></tr>"
+        "<tr><td>Magnitude</td><td>Location</td></tr></table>"
+    )
+    event_table = (
+        "<table class=MsoNormalTable border=1 cellspacing=0 cellpadding=0>"
+        "<tr><th>Date - Time</th><th>Latitude</th><th>Longitude</th><th>Depth</th><th>Mag</th><th>Location</th></tr>"
+        + "".join(rows)
+        + "</table>"
+    )
+    return f"<html><head><title>PHIVOLCS</title></head><body>{filler}{header_table}{event_table}{filler}</body></html>"
+
+
+def legacy_parse(html):
+    """The BeautifulSoup scan used before the lxml parser"""
+    from bs4 import BeautifulSoup
+    from urllib.parse import urljoin
+    from app.api import BASE_URL
+
+    soup = BeautifulSoup(html, "html.parser")
+    earthquake = None
+
+    for table in soup.select('table.MsoNormalTable'):
+        try:
+            row = table.select('tr')[1]
+        except IndexError:
+            continue
+
+        cells = row.find_all('td')
+        if not cells or len(cells) != 6:
+            continue
+
+        a_tag = cells[0].find('a')
+        href = a_tag['href'] if a_tag and 'href' in a_tag.attrs else None
+
+        earthquake = {
+            "date_time": a_tag.get_text().strip(),
+            "latitude": cells[1].get_text().strip(),
+            "longitude": cells[2].get_text().strip(),
+            "depth": cells[3].get_text().strip(),
+            "magnitude": cells[4].get_text().strip(),
+            "location": cells[5].get_text().strip(),
+            "detail_link": urljoin(BASE_URL, href.replace('\\', '/')) if href else None
+        }
+
+    return earthquake
+
+
+def time_parser(parser, html):
+    """Best-of-N wall time in milliseconds"""
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        parser(html)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(pages):
+    """Both parsers must agree on every page; report the parse time of each"""
+    print("=" * 70)
+    print("⏱️  BENCHMARKING BULLETIN PARSER")
+    print("=" * 70)
+
+    try:
+        from app.api import parse_latest_earthquake
+
+        if not pages:
+            pages = {'synthetic (800 rows)': build_fixture_page()}
+
+        for name, html in pages.items():
+            expected = legacy_parse(html)
+            actual = parse_latest_earthquake(html)
+
+            if actual != expected:
+                print(f"❌ {name}: parsers disagree")
+                print(f"   legacy: {expected}")
+                print(f"   lxml:   {actual}")
+                return False
+
+            legacy_ms = time_parser(legacy_parse, html)
+            lxml_ms = time_parser(parse_latest_earthquake, html)
+
+            print(f"📄 {name} ({len(html) / 1024:.0f} KB)")
+            print(f"   BeautifulSoup html.parser: {legacy_ms:8.1f} ms")
+            print(f"   lxml:                      {lxml_ms:8.1f} ms")
+            print(f"   Speedup:                   {legacy_ms / lxml_ms:8.1f}x")
+
+        print("\n✅ Parser benchmark complete")
+        return True
+    except Exception as e:
+        print(f"❌ Parser benchmark failed: {e}")
+        return False
+
+
+def test_parser_benchmark():
+    """Benchmark against the synthetic fixture page"""
+    return run_benchmark(None)
+
+
+def main():
+    pages = {}
+    for path in sys.argv[1:]:
+        with open(path, encoding='utf-8', errors='replace') as page:
+            pages[os.path.basename(path)] = page.read()
+
+    return 0 if run_benchmark(pages) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())